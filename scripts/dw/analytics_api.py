@@ -0,0 +1,325 @@
+"""
+Service de lecture (API JSON) sur le Data Warehouse : performances par examen,
+filière et étudiant, à partir des vues vw_*.
+
+- Connexions PostgreSQL en pool (psycopg2.pool.ThreadedConnectionPool)
+- Cache mémoire LRU + TTL des réponses déjà sérialisées
+- Invalidation du cache dès qu'une exécution ETL se termine
+  (NOTIFY etl_load_completed émis par finish_run, écouté sur une connexion dédiée)
+- Accès réservé : en-tête Authorization: Bearer <ANALYTICS_API_TOKEN> (les vues
+  étudiants exposent email, matricule et scores), écoute locale par défaut
+
+Endpoints :
+    GET /api/analytics/exams
+    GET /api/analytics/exams/<exam_key>
+    GET /api/analytics/filieres
+    GET /api/analytics/students?limit=100&offset=0
+    GET /api/analytics/students/<student_key>
+    GET /health
+"""
+
+import hmac
+import json
+import os
+import sys
+import re
+import select
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+PG_CONFIG = {
+    'host': os.getenv('PG_HOST', 'localhost'),
+    'port': os.getenv('PG_PORT', '5432'),
+    'database': os.getenv('PG_DB', 'datawarehouse'),
+    'user': os.getenv('PG_USER', 'postgres'),
+    'password': os.getenv('PG_PASSWORD', 'password'),
+}
+
+API_HOST = os.getenv('ANALYTICS_API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('ANALYTICS_API_PORT', '5001'))
+API_POOL_SIZE = int(os.getenv('ANALYTICS_API_POOL_SIZE', '8'))
+API_CORS_ORIGIN = os.getenv('ANALYTICS_API_CORS_ORIGIN', os.getenv('FRONTEND_URL', 'http://localhost:3000'))
+# Secret partagé exigé sur toutes les routes /api (pas de valeur par défaut)
+API_TOKEN = os.getenv('ANALYTICS_API_TOKEN', '')
+
+# Cache : nombre de réponses gardées et durée de vie maximale (filet de sécurité)
+CACHE_MAX_ENTRIES = int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '512'))
+CACHE_TTL = int(os.getenv('ANALYTICS_CACHE_TTL', '3600'))
+
+ETL_CHANNEL = 'etl_load_completed'
+
+# ============================================
+# CACHE LRU / TTL
+# ============================================
+
+class ResultCache:
+    """Cache LRU avec durée de vie, partagé entre les threads du serveur"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Incrémentée à chaque invalidation : une requête lancée avant ne remplit pas le cache
+        self.generation = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def current_generation(self):
+        with self.lock:
+            return self.generation
+
+    def put(self, key, value, generation):
+        with self.lock:
+            if generation != self.generation:
+                return False
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return True
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.invalidations += 1
+            self.generation += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+# ============================================
+# REQUETES
+# ============================================
+
+QUERIES = {
+    'exams': "SELECT * FROM vw_exam_summary ORDER BY exam_key",
+    'exam': "SELECT * FROM vw_exam_summary WHERE exam_key = %s",
+    'filieres': "SELECT * FROM vw_filiere_performance ORDER BY filiere_key",
+    'students': "SELECT * FROM vw_student_performance ORDER BY student_key LIMIT %s OFFSET %s",
+    'student': "SELECT * FROM vw_student_performance WHERE student_key = %s",
+}
+
+ROUTES = [
+    (re.compile(r'^/api/analytics/exams/?$'), 'exams'),
+    (re.compile(r'^/api/analytics/exams/(\d+)$'), 'exam'),
+    (re.compile(r'^/api/analytics/filieres/?$'), 'filieres'),
+    (re.compile(r'^/api/analytics/students/?$'), 'students'),
+    (re.compile(r'^/api/analytics/students/(\d+)$'), 'student'),
+]
+
+def to_json(value):
+    """Sérialiser les types PostgreSQL (DECIMAL, dates) en JSON"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Type non serialisable : {type(value)}")
+
+class AnalyticsService:
+    """Exécuter les requêtes du DW via le pool, avec mise en cache des réponses"""
+
+    def __init__(self, pool, cache, pool_size=API_POOL_SIZE):
+        self.pool = pool
+        self.cache = cache
+        # Un thread HTTP par requête : au-delà de la taille du pool, getconn() lèverait PoolError
+        self.slots = threading.BoundedSemaphore(pool_size)
+
+    def fetch(self, query_name, params=()):
+        """Retourner la réponse JSON (bytes) d'une requête, depuis le cache si possible"""
+        key = (query_name, params)
+        body = self.cache.get(key)
+        if body is not None:
+            return body
+
+        # Génération lue avant la requête : si un chargement se termine pendant la lecture,
+        # la réponse (peut-être antérieure au chargement) n'est pas mise en cache
+        generation = self.cache.current_generation()
+        with self.slots:
+            conn = self.pool.getconn()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(QUERIES[query_name], params)
+                columns = [desc[0] for desc in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                cursor.close()
+                conn.rollback()  # Lecture seule : ne pas laisser de transaction ouverte
+            finally:
+                self.pool.putconn(conn)
+
+        if query_name in ('exam', 'student'):
+            data = rows[0] if rows else None
+        else:
+            data = rows
+        body = json.dumps(data, default=to_json).encode('utf-8')
+        self.cache.put(key, body, generation)
+        return body
+
+# ============================================
+# INVALIDATION (LISTEN / NOTIFY)
+# ============================================
+
+def listen_for_loads(cache, stop_event):
+    """Vider le cache à chaque chargement ETL terminé ; se reconnecter en cas d'erreur"""
+    while not stop_event.is_set():
+        try:
+            conn = psycopg2.connect(**PG_CONFIG)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {ETL_CHANNEL}")
+            # Des chargements ont pu se terminer pendant la déconnexion
+            cache.invalidate()
+            print(f"[CACHE] En ecoute sur le canal {ETL_CHANNEL}")
+
+            while not stop_event.is_set():
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    run_ids = [notify.payload for notify in conn.notifies]
+                    conn.notifies.clear()
+                    cache.invalidate()
+                    print(f"[CACHE] Chargement ETL termine (execution(s) {', '.join(run_ids)}) : cache invalide")
+            conn.close()
+        except Exception as e:
+            print(f"[CACHE] Ecoute interrompue : {e} (nouvelle tentative dans 5s)")
+            stop_event.wait(5)
+
+# ============================================
+# SERVEUR HTTP
+# ============================================
+
+class AnalyticsHandler(BaseHTTPRequestHandler):
+    """Routes GET de l'API analytique"""
+
+    service = None
+
+    def send_cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', API_CORS_ORIGIN)
+        self.send_header('Vary', 'Origin')
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, json.dumps({'message': message}).encode('utf-8'))
+
+    def is_authorized(self):
+        """Vérifier le jeton Bearer (comparaison à temps constant)"""
+        header = self.headers.get('Authorization', '')
+        scheme, _, token = header.partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(token.strip().encode(), API_TOKEN.encode())
+
+    def do_OPTIONS(self):
+        # Pré-vérification CORS du navigateur (en-tête Authorization)
+        self.send_response(204)
+        self.send_cors_headers()
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Authorization')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            return self.send_json(200, json.dumps({
+                'status': 'ok', 'cache': self.service.cache.stats()
+            }).encode('utf-8'))
+
+        if not self.is_authorized():
+            return self.send_error_json(401, "Non autorise, token manquant ou invalide")
+
+        for pattern, query_name in ROUTES:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            try:
+                if query_name == 'students':
+                    query = parse_qs(url.query)
+                    limit = min(int(query.get('limit', ['100'])[0]), 1000)
+                    offset = int(query.get('offset', ['0'])[0])
+                    if limit < 0 or offset < 0:
+                        raise ValueError("limit et offset doivent etre positifs")
+                    params = (limit, offset)
+                else:
+                    params = tuple(int(group) for group in match.groups())
+            except ValueError:
+                return self.send_error_json(400, "Parametres invalides")
+
+            try:
+                body = self.service.fetch(query_name, params)
+            except Exception as e:
+                print(f"[ERREUR] {query_name} : {e}")
+                return self.send_error_json(500, "Erreur lors de la lecture du Data Warehouse")
+            if body == b'null':
+                return self.send_error_json(404, "Introuvable")
+            return self.send_json(200, body)
+
+        self.send_error_json(404, "Route inconnue")
+
+def run_server(host=API_HOST, port=API_PORT):
+    """Démarrer le pool, l'écoute des chargements ETL et le serveur HTTP"""
+    if not API_TOKEN:
+        print("[ERREUR] ANALYTICS_API_TOKEN non defini : l'API expose les resultats des etudiants")
+        sys.exit(1)
+
+    pool = ThreadedConnectionPool(1, API_POOL_SIZE, **PG_CONFIG)
+    cache = ResultCache()
+    AnalyticsHandler.service = AnalyticsService(pool, cache, API_POOL_SIZE)
+
+    stop_event = threading.Event()
+    listener = threading.Thread(target=listen_for_loads, args=(cache, stop_event), daemon=True)
+    listener.start()
+
+    server = ThreadingHTTPServer((host, port), AnalyticsHandler)
+    print(f"[OK] API analytique sur http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[INFO] Arret du serveur")
+    finally:
+        stop_event.set()
+        server.server_close()
+        pool.closeall()
+
+if __name__ == "__main__":
+    print("="*60)
+    print("API ANALYTIQUE DU DATA WAREHOUSE")
+    print("="*60)
+    run_server()
@@ -1,15 +1,24 @@
 -- Script de création du Data Warehouse
 -- SGBD : PostgreSQL (peut être adapté pour MySQL)
 -- Modèle en étoile pour l'analyse des résultats d'examens
+-- Schéma complet de référence ; un DW existant évolue avec migrate_schema.py (migrations/)
 
 -- ============================================
 -- DIMENSIONS
 -- ============================================
 
+-- Dimension : Source (une base MongoDB par campus)
+CREATE TABLE dim_source (
+    source_key SERIAL PRIMARY KEY,
+    source_name VARCHAR(100) NOT NULL UNIQUE, -- Nom de la base MongoDB
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Dimension : Examen
 CREATE TABLE dim_exam (
     exam_key SERIAL PRIMARY KEY,
-    exam_id VARCHAR(50) NOT NULL UNIQUE,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    exam_id VARCHAR(50) NOT NULL,
     title VARCHAR(255) NOT NULL,
     description TEXT,
     total_points DECIMAL(10,2) NOT NULL,
@@ -21,7 +30,8 @@ CREATE TABLE dim_exam (
     updated_date DATE,
     valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     valid_to TIMESTAMP,
-    is_current BOOLEAN DEFAULT TRUE
+    is_current BOOLEAN DEFAULT TRUE,
+    CONSTRAINT uq_dim_exam_source UNIQUE (source_key, exam_id)
 );
 
 CREATE INDEX idx_dim_exam_exam_id ON dim_exam(exam_id);
@@ -30,7 +40,8 @@ CREATE INDEX idx_dim_exam_title ON dim_exam(title);
 -- Dimension : Étudiant
 CREATE TABLE dim_student (
     student_key SERIAL PRIMARY KEY,
-    student_id VARCHAR(50) NOT NULL UNIQUE,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    student_id VARCHAR(50) NOT NULL,
     username VARCHAR(100) NOT NULL,
     email VARCHAR(255) NOT NULL,
     first_name VARCHAR(100),
@@ -40,7 +51,8 @@ CREATE TABLE dim_student (
     student_number VARCHAR(50),
     valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     valid_to TIMESTAMP,
-    is_current BOOLEAN DEFAULT TRUE
+    is_current BOOLEAN DEFAULT TRUE,
+    CONSTRAINT uq_dim_student_source UNIQUE (source_key, student_id)
 );
 
 CREATE INDEX idx_dim_student_student_id ON dim_student(student_id);
@@ -50,14 +62,17 @@ CREATE INDEX idx_dim_student_full_name ON dim_student(full_name);
 -- Dimension : Filière
 CREATE TABLE dim_filiere (
     filiere_key SERIAL PRIMARY KEY,
-    filiere_id VARCHAR(50) NOT NULL UNIQUE,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    filiere_id VARCHAR(50) NOT NULL,
     name VARCHAR(255) NOT NULL,
-    code VARCHAR(50) NOT NULL UNIQUE,
+    code VARCHAR(50) NOT NULL,
     description TEXT,
     duration INTEGER,
     valid_from TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     valid_to TIMESTAMP,
-    is_current BOOLEAN DEFAULT TRUE
+    is_current BOOLEAN DEFAULT TRUE,
+    CONSTRAINT uq_dim_filiere_source UNIQUE (source_key, filiere_id),
+    CONSTRAINT uq_dim_filiere_code UNIQUE (source_key, code)
 );
 
 CREATE INDEX idx_dim_filiere_filiere_id ON dim_filiere(filiere_id);
@@ -84,6 +99,37 @@ CREATE TABLE dim_date (
 CREATE INDEX idx_dim_date_date ON dim_date(date);
 CREATE INDEX idx_dim_date_year_month ON dim_date(year, month);
 
+-- Dimension : Question (questions des examens)
+CREATE TABLE dim_question (
+    question_key SERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    question_id VARCHAR(50) NOT NULL, -- _id MongoDB de la question
+    exam_key INTEGER NOT NULL REFERENCES dim_exam(exam_key),
+    position INTEGER NOT NULL, -- Rang de la question dans l'examen (1 = première)
+    question_text TEXT NOT NULL,
+    question_type VARCHAR(20) NOT NULL, -- multiple_choice, true_false, text
+    points DECIMAL(10,2) NOT NULL,
+    CONSTRAINT uq_dim_question_source UNIQUE (source_key, question_id)
+);
+
+CREATE INDEX idx_dim_question_exam_key ON dim_question(exam_key);
+
+-- Dimension : Enseignant (utilisateurs de rôle teacher)
+CREATE TABLE dim_teacher (
+    teacher_key SERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    teacher_id VARCHAR(50) NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    specialization VARCHAR(255),
+    teacher_number VARCHAR(50),
+    hire_date DATE,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    CONSTRAINT uq_dim_teacher_source UNIQUE (source_key, teacher_id)
+);
+
 -- Fonction pour remplir la dimension date (optionnel)
 -- Peut être utilisée pour générer les dates de 2020 à 2030
 CREATE OR REPLACE FUNCTION fill_dim_date(start_date DATE, end_date DATE)
@@ -125,6 +171,8 @@ $$ LANGUAGE plpgsql;
 
 CREATE TABLE fact_exam_results (
     fact_id SERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    submission_id VARCHAR(50), -- _id MongoDB de la soumission (clé naturelle par source)
     exam_key INTEGER NOT NULL REFERENCES dim_exam(exam_key),
     student_key INTEGER NOT NULL REFERENCES dim_student(student_key),
     filiere_key INTEGER NOT NULL REFERENCES dim_filiere(filiere_key),
@@ -141,6 +189,9 @@ CREATE TABLE fact_exam_results (
     load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Clé naturelle : un rechargement (reprise, chargement parallèle) ne crée pas de doublon
+CREATE UNIQUE INDEX uq_fact_source_submission ON fact_exam_results(source_key, submission_id);
+
 -- Index pour améliorer les performances
 CREATE INDEX idx_fact_exam_key ON fact_exam_results(exam_key);
 CREATE INDEX idx_fact_student_key ON fact_exam_results(student_key);
@@ -148,11 +199,162 @@ CREATE INDEX idx_fact_filiere_key ON fact_exam_results(filiere_key);
 CREATE INDEX idx_fact_date_key ON fact_exam_results(date_key);
 CREATE INDEX idx_fact_passed ON fact_exam_results(passed);
 CREATE INDEX idx_fact_submitted_at ON fact_exam_results(submitted_at);
+CREATE INDEX idx_fact_load_timestamp ON fact_exam_results(load_timestamp);
+CREATE INDEX idx_fact_month ON fact_exam_results((date_key / 100));
 
 -- Index composite pour les requêtes fréquentes
 CREATE INDEX idx_fact_exam_student ON fact_exam_results(exam_key, student_key);
 CREATE INDEX idx_fact_filiere_date ON fact_exam_results(filiere_key, date_key);
 
+-- Table de faits : réponses par question (une ligne par réponse d'une soumission)
+CREATE TABLE fact_question_answers (
+    answer_fact_id BIGSERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    submission_id VARCHAR(50) NOT NULL,
+    question_key INTEGER NOT NULL REFERENCES dim_question(question_key),
+    exam_key INTEGER NOT NULL REFERENCES dim_exam(exam_key),
+    student_key INTEGER NOT NULL REFERENCES dim_student(student_key),
+    date_key INTEGER NOT NULL REFERENCES dim_date(date_key),
+    answer_text TEXT,
+    points_earned DECIMAL(10,2) NOT NULL,
+    points_possible DECIMAL(10,2) NOT NULL,
+    is_correct BOOLEAN NOT NULL,
+    load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (submission_id, question_key)
+);
+
+CREATE INDEX idx_fqa_question_key ON fact_question_answers(question_key);
+CREATE INDEX idx_fqa_exam_key ON fact_question_answers(exam_key);
+CREATE INDEX idx_fqa_student_key ON fact_question_answers(student_key);
+
+-- Table de faits : publications de contenus pédagogiques (cours et TP)
+CREATE TABLE fact_publications (
+    publication_id SERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    content_type VARCHAR(10) NOT NULL, -- course, tp
+    content_id VARCHAR(50) NOT NULL, -- _id MongoDB du cours ou du TP
+    teacher_key INTEGER NOT NULL REFERENCES dim_teacher(teacher_key),
+    filiere_key INTEGER NOT NULL REFERENCES dim_filiere(filiere_key),
+    date_key INTEGER NOT NULL REFERENCES dim_date(date_key), -- Date de publication (à défaut, de création)
+    title VARCHAR(255) NOT NULL,
+    file_name VARCHAR(255),
+    file_type VARCHAR(100),
+    file_size BIGINT, -- Octets
+    is_published BOOLEAN NOT NULL DEFAULT FALSE,
+    published_at TIMESTAMP,
+    deadline TIMESTAMP, -- TP uniquement
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP,
+    load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_fact_publication_source UNIQUE (source_key, content_type, content_id)
+);
+
+CREATE INDEX idx_fpub_teacher_key ON fact_publications(teacher_key);
+CREATE INDEX idx_fpub_filiere_key ON fact_publications(filiere_key);
+CREATE INDEX idx_fpub_date_key ON fact_publications(date_key);
+
+-- ============================================
+-- AGREGATS : DISTRIBUTIONS DE SCORES (maintenus par l'ETL)
+-- ============================================
+
+-- grain : exam (grain_key = exam_key), filiere (filiere_key), month (AAAAMM)
+CREATE TABLE agg_score_histogram (
+    grain VARCHAR(10) NOT NULL,
+    grain_key INTEGER NOT NULL,
+    bucket_start SMALLINT NOT NULL, -- Borne basse du pourcentage (incluse)
+    bucket_end SMALLINT NOT NULL, -- Borne haute (exclue, sauf 100 dans le dernier intervalle)
+    submissions INTEGER NOT NULL,
+    PRIMARY KEY (grain, grain_key, bucket_start)
+);
+
+CREATE TABLE agg_score_percentiles (
+    grain VARCHAR(10) NOT NULL,
+    grain_key INTEGER NOT NULL,
+    submissions INTEGER NOT NULL,
+    avg_percentage DECIMAL(5,2) NOT NULL,
+    p10 DECIMAL(5,2) NOT NULL,
+    p25 DECIMAL(5,2) NOT NULL,
+    median DECIMAL(5,2) NOT NULL,
+    p75 DECIMAL(5,2) NOT NULL,
+    p90 DECIMAL(5,2) NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (grain, grain_key)
+);
+
+-- ============================================
+-- TABLES DE CONTROLE ETL
+-- ============================================
+
+-- Exécutions ETL et checkpoints (dernière frontière de chunk validée)
+CREATE TABLE IF NOT EXISTS etl_runs (
+    run_id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'running', -- running, completed, failed, interrupted, abandoned
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    last_submission_id VARCHAR(50), -- _id MongoDB de la dernière soumission validée
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    facts_loaded INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT,
+    since TIMESTAMP, -- Mode incrémental : soumissions modifiées depuis (NULL = exécution complète)
+    watermark TIMESTAMP, -- Début de l'exécution (UTC) : borne du prochain incrémental
+    source_key INTEGER REFERENCES dim_source(source_key), -- Base MongoDB chargée
+    engine VARCHAR(20) NOT NULL DEFAULT 'chunked' -- chunked (par chunks), multi_source
+);
+
+CREATE INDEX IF NOT EXISTS idx_etl_runs_source ON etl_runs(source_key, engine, status);
+
+-- Index secondaires des faits supprimés pendant un rechargement complet
+-- (définitions conservées jusqu'à leur reconstruction, même si le chargement échoue)
+CREATE TABLE IF NOT EXISTS etl_deferred_indexes (
+    index_name VARCHAR(100) PRIMARY KEY,
+    table_name VARCHAR(100) NOT NULL,
+    definition TEXT NOT NULL, -- pg_get_indexdef
+    dropped_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Dernier fait intégré aux distributions (les suivants forment le delta du prochain rafraîchissement)
+CREATE TABLE IF NOT EXISTS agg_refresh_state (
+    aggregate_name VARCHAR(50) PRIMARY KEY,
+    last_fact_id BIGINT NOT NULL DEFAULT 0,
+    facts_counted BIGINT, -- Faits intégrés (un écart avec COUNT(*) impose un recalcul complet)
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Groupes des distributions touchés par des faits modifiés (recalculés au prochain rafraîchissement)
+CREATE TABLE IF NOT EXISTS agg_dirty_groups (
+    grain VARCHAR(10) NOT NULL,
+    grain_key INTEGER NOT NULL,
+    PRIMARY KEY (grain, grain_key)
+);
+
+-- Anciennes et nouvelles valeurs des faits modifiés par l'upsert de l'ETL
+CREATE OR REPLACE FUNCTION mark_score_groups_dirty() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO agg_dirty_groups (grain, grain_key)
+    SELECT DISTINCT g.grain, g.grain_key
+    FROM (
+        SELECT exam_key, filiere_key, date_key FROM old_rows
+        UNION
+        SELECT exam_key, filiere_key, date_key FROM new_rows
+    ) f
+    CROSS JOIN LATERAL (VALUES
+        ('exam', f.exam_key),
+        ('filiere', f.filiere_key),
+        ('month', f.date_key / 100)
+    ) AS g(grain, grain_key)
+    ON CONFLICT (grain, grain_key) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Une exécution par instruction INSERT ... ON CONFLICT (load_facts envoie chaque chunk,
+-- ou chaque tranche du chargement parallèle, en une seule instruction)
+CREATE TRIGGER trg_fact_score_groups_dirty
+    AFTER UPDATE ON fact_exam_results
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE mark_score_groups_dirty();
+
 -- ============================================
 -- VUES POUR FACILITER L'ANALYSE
 -- ============================================
@@ -233,17 +435,108 @@ FROM dim_student s
 LEFT JOIN fact_exam_results f ON s.student_key = f.student_key
 GROUP BY s.student_key, s.full_name, s.email, s.student_number;
 
+-- Vue : Difficulté et discrimination par question
+-- difficulty_index : part moyenne des points obtenus (p, 0 = très difficile, 1 = très facile)
+-- discrimination_index : corrélation entre les points de la question et le pourcentage total
+CREATE OR REPLACE VIEW vw_question_difficulty AS
+SELECT
+    q.question_key,
+    q.exam_key,
+    e.title AS exam_title,
+    q.position,
+    q.question_text,
+    q.question_type,
+    q.points,
+    COUNT(a.answer_fact_id) AS total_answers,
+    COUNT(CASE WHEN a.is_correct THEN 1 END) AS correct_count,
+    ROUND(AVG(a.points_earned / NULLIF(a.points_possible, 0)), 4) AS difficulty_index,
+    ROUND(CORR(a.points_earned::FLOAT8, f.percentage::FLOAT8)::NUMERIC, 4) AS discrimination_index
+FROM dim_question q
+JOIN dim_exam e ON e.exam_key = q.exam_key
+LEFT JOIN fact_question_answers a ON a.question_key = q.question_key
+LEFT JOIN fact_exam_results f ON f.source_key = a.source_key AND f.submission_id = a.submission_id
+GROUP BY q.question_key, q.exam_key, e.title, q.position, q.question_text, q.question_type, q.points;
+
+-- Vue : Cours et TP publiés par filière
+CREATE OR REPLACE VIEW vw_filiere_publications AS
+SELECT
+    fil.filiere_key,
+    fil.name AS filiere_name,
+    fil.code AS filiere_code,
+    COUNT(CASE WHEN p.content_type = 'course' THEN 1 END) AS total_courses,
+    COUNT(CASE WHEN p.content_type = 'tp' THEN 1 END) AS total_tps,
+    COUNT(CASE WHEN p.is_published THEN 1 END) AS published_count,
+    COUNT(DISTINCT p.teacher_key) AS total_teachers,
+    MAX(p.published_at) AS last_published_at
+FROM dim_filiere fil
+LEFT JOIN fact_publications p ON p.filiere_key = fil.filiere_key
+GROUP BY fil.filiere_key, fil.name, fil.code;
+
+-- Vue : Percentiles par examen, filière et mois
+CREATE OR REPLACE VIEW vw_score_percentiles AS
+SELECT
+    p.grain,
+    p.grain_key,
+    CASE p.grain
+        WHEN 'exam' THEN e.title
+        WHEN 'filiere' THEN fil.name
+        ELSE TO_CHAR(TO_DATE(p.grain_key::TEXT, 'YYYYMM'), 'YYYY-MM')
+    END AS grain_label,
+    p.submissions,
+    p.avg_percentage,
+    p.p10,
+    p.p25,
+    p.median,
+    p.p75,
+    p.p90,
+    p.refreshed_at
+FROM agg_score_percentiles p
+LEFT JOIN dim_exam e ON p.grain = 'exam' AND e.exam_key = p.grain_key
+LEFT JOIN dim_filiere fil ON p.grain = 'filiere' AND fil.filiere_key = p.grain_key;
+
+-- Vue : Histogrammes des pourcentages par examen, filière et mois
+CREATE OR REPLACE VIEW vw_score_histogram AS
+SELECT
+    h.grain,
+    h.grain_key,
+    CASE h.grain
+        WHEN 'exam' THEN e.title
+        WHEN 'filiere' THEN fil.name
+        ELSE TO_CHAR(TO_DATE(h.grain_key::TEXT, 'YYYYMM'), 'YYYY-MM')
+    END AS grain_label,
+    h.bucket_start,
+    h.bucket_end,
+    h.bucket_start || '-' || h.bucket_end AS bucket_label,
+    h.submissions,
+    ROUND(h.submissions::NUMERIC / NULLIF(SUM(h.submissions) OVER (PARTITION BY h.grain, h.grain_key), 0) * 100, 2) AS share_pct
+FROM agg_score_histogram h
+LEFT JOIN dim_exam e ON h.grain = 'exam' AND e.exam_key = h.grain_key
+LEFT JOIN dim_filiere fil ON h.grain = 'filiere' AND fil.filiere_key = h.grain_key;
+
 -- ============================================
 -- COMMENTAIRES POUR DOCUMENTATION
 -- ============================================
 
+COMMENT ON TABLE dim_source IS 'Dimension des sources (bases MongoDB par campus)';
 COMMENT ON TABLE dim_exam IS 'Dimension des examens';
 COMMENT ON TABLE dim_student IS 'Dimension des étudiants';
 COMMENT ON TABLE dim_filiere IS 'Dimension des filières';
 COMMENT ON TABLE dim_date IS 'Dimension temporelle (table calendrier)';
+COMMENT ON TABLE dim_question IS 'Dimension des questions d''examen';
 COMMENT ON TABLE fact_exam_results IS 'Table de faits : résultats des examens';
+COMMENT ON TABLE fact_question_answers IS 'Table de faits : réponses par question';
+COMMENT ON TABLE dim_teacher IS 'Dimension des enseignants';
+COMMENT ON TABLE fact_publications IS 'Table de faits : publications de cours et de TP';
+COMMENT ON TABLE etl_runs IS 'Contrôle ETL : exécutions et checkpoints de reprise';
+COMMENT ON TABLE agg_score_histogram IS 'Agrégat : histogramme des pourcentages (intervalles fixes) par examen, filière et mois';
+COMMENT ON TABLE agg_score_percentiles IS 'Agrégat : percentiles des pourcentages par examen, filière et mois';
+COMMENT ON TABLE agg_refresh_state IS 'Contrôle ETL : dernier fait intégré à chaque agrégat';
+COMMENT ON TABLE agg_dirty_groups IS 'Contrôle ETL : groupes des distributions touchés par des faits modifiés';
+COMMENT ON TABLE etl_deferred_indexes IS 'Contrôle ETL : index différés pendant les rechargements complets';
 
 COMMENT ON COLUMN fact_exam_results.fact_id IS 'Clé primaire de la table de faits';
+COMMENT ON COLUMN fact_exam_results.source_key IS 'Clé étrangère vers dim_source (base MongoDB d''origine)';
+COMMENT ON COLUMN fact_exam_results.submission_id IS 'Identifiant MongoDB de la soumission (unique par source)';
 COMMENT ON COLUMN fact_exam_results.exam_key IS 'Clé étrangère vers dim_exam';
 COMMENT ON COLUMN fact_exam_results.student_key IS 'Clé étrangère vers dim_student';
 COMMENT ON COLUMN fact_exam_results.filiere_key IS 'Clé étrangère vers dim_filiere';
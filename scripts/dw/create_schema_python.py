@@ -1,8 +1,9 @@
 
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import os
+import sys
 from dotenv import load_dotenv
+from migrate_schema import MIGRATIONS_DIR, run_migrations
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -21,31 +22,9 @@ def create_schema():
         )
         print("[OK] Connexion PostgreSQL reussie")
         
-        # Lire le fichier SQL
-        sql_file = os.path.join(os.path.dirname(__file__), 'create_dw_schema.sql')
-        print(f"[INFO] Lecture du fichier : {sql_file}")
-        
-        with open(sql_file, 'r', encoding='utf-8') as f:
-            sql_content = f.read()
-        
-        # Utiliser autocommit pour exécuter le script complet
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        cursor = conn.cursor()
-        
-        print(f"[INFO] Execution du script SQL...")
-        
-        # Exécuter le SQL complet
-        try:
-            cursor.execute(sql_content)
-            print(f"[OK] Script SQL execute avec succes")
-        except Exception as e:
-            error_msg = str(e)
-            # Les erreurs "already exists" sont normales si le schéma existe déjà
-            if 'already exists' in error_msg.lower() or 'duplicate' in error_msg.lower():
-                print(f"[INFO] Certains objets existent deja (normal si re-execution)")
-            else:
-                print(f"[WARN] Erreur : {error_msg[:200]}")
-                # Essayer quand même de continuer
+        # Appliquer les migrations en attente (migrations/NNN_nom.sql)
+        print(f"[INFO] Migrations : {MIGRATIONS_DIR}")
+        run_migrations(conn)
         
         # Vérifier les tables créées
         cursor = conn.cursor()
@@ -76,10 +55,14 @@ def create_schema():
         print("  - PostgreSQL est demarre")
         print("  - La base de donnees 'datawarehouse' existe")
         print("  - Les identifiants dans .env sont corrects")
+        sys.exit(1)
     except FileNotFoundError:
-        print(f"[ERREUR] Fichier SQL non trouve : {sql_file}")
+        print(f"[ERREUR] Repertoire des migrations non trouve : {MIGRATIONS_DIR}")
+        sys.exit(1)
     except Exception as e:
+        # Migration en échec : code de sortie non nul pour l'appelant (CI, scripts)
         print(f"[ERREUR] Erreur : {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     print("="*60)
@@ -0,0 +1,210 @@
+"""
+Migrations versionnées du schéma du Data Warehouse.
+
+- Les migrations sont les fichiers migrations/NNN_nom.sql, appliquées dans l'ordre de NNN
+- schema_migrations garde les versions appliquées (nom, somme de contrôle, date, durée)
+- Chaque migration est idempotente (IF NOT EXISTS, CREATE OR REPLACE) : elle peut
+  s'appliquer sur un DW déjà créé avec create_dw_schema.sql
+- Une migration s'exécute dans une transaction avec l'enregistrement de sa version,
+  sauf si elle commence par "-- migration: no-transaction" : ses instructions sont alors
+  exécutées une à une en autocommit, comme l'exige CREATE INDEX CONCURRENTLY
+- Un verrou consultatif empêche deux exécutions simultanées du runner
+
+Utilisation :
+    python migrate_schema.py             # appliquer les migrations en attente
+    python migrate_schema.py --status    # versions appliquées / en attente
+    python migrate_schema.py --target 5  # s'arrêter à la version 5
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+PG_CONFIG = {
+    'host': os.getenv('PG_HOST', 'localhost'),
+    'port': os.getenv('PG_PORT', '5432'),
+    'database': os.getenv('PG_DB', 'datawarehouse'),
+    'user': os.getenv('PG_USER', 'postgres'),
+    'password': os.getenv('PG_PASSWORD', 'password'),
+}
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_LOCK_KEY = int(os.getenv('DW_MIGRATION_LOCK_KEY', '730262'))
+NO_TRANSACTION = '-- migration: no-transaction'
+
+# Source à laquelle rattacher les lignes d'un DW mono-source (migration 005)
+LEGACY_SOURCE = os.getenv('MONGO_DB', 'votre_db')
+
+# ============================================
+# LECTURE DES MIGRATIONS
+# ============================================
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Lister les migrations NNN_nom.sql, triées par version"""
+    migrations = {}
+    for file_name in os.listdir(directory):
+        match = re.match(r'^(\d+)_(\w+)\.sql$', file_name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Version de migration en double : {version}")
+        with open(os.path.join(directory, file_name), 'r', encoding='utf-8') as f:
+            sql = f.read()
+        migrations[version] = {
+            'version': version,
+            'name': match.group(2),
+            'sql': sql,
+            'checksum': hashlib.md5(sql.encode('utf-8')).hexdigest(),
+            'transactional': not sql.startswith(NO_TRANSACTION)
+        }
+    return [migrations[version] for version in sorted(migrations)]
+
+def concurrent_index_names(sql):
+    """Index construits avec CREATE INDEX CONCURRENTLY par une migration"""
+    return re.findall(
+        r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?"?(\w+)"?',
+        sql, re.IGNORECASE
+    )
+
+def split_statements(sql):
+    """Découper une migration sans transaction en instructions (pas de bloc $$ dans ces fichiers)"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+# ============================================
+# APPLICATION
+# ============================================
+
+def ensure_version_table(cursor):
+    """Créer la table des versions appliquées"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            checksum VARCHAR(32) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    """)
+
+def drop_invalid_indexes(cursor, index_names):
+    """Supprimer les index de la migration laissés invalides par un CREATE INDEX CONCURRENTLY
+    interrompu (les autres index invalides peuvent être des constructions en cours)"""
+    if not index_names:
+        return
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND NOT i.indisvalid AND c.relname = ANY(%s)
+    """, (index_names,))
+    for (index_name,) in cursor.fetchall():
+        print(f"   [INFO] Suppression de l'index invalide {index_name}")
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+def apply_migration(cursor, migration):
+    """Appliquer une migration et enregistrer sa version"""
+    start = time.perf_counter()
+    record = """
+        INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+        VALUES (%s, %s, %s, %s)
+    """
+
+    if migration['transactional']:
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute(migration['sql'])
+            cursor.execute(record, (
+                migration['version'], migration['name'], migration['checksum'],
+                int((time.perf_counter() - start) * 1000)
+            ))
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+    else:
+        # Instructions idempotentes : une reprise après échec repart de la première
+        drop_invalid_indexes(cursor, concurrent_index_names(migration['sql']))
+        for statement in split_statements(migration['sql']):
+            cursor.execute(statement)
+        cursor.execute(record, (
+            migration['version'], migration['name'], migration['checksum'],
+            int((time.perf_counter() - start) * 1000)
+        ))
+
+def run_migrations(conn, legacy_source=LEGACY_SOURCE, target=None):
+    """Appliquer les migrations en attente ; retourne les versions appliquées"""
+    conn.commit()  # Aucune transaction ouverte avant le passage en autocommit
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
+    applied_now = []
+
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        ensure_version_table(cursor)
+        cursor.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cursor.fetchall())
+        cursor.execute("SELECT set_config('dw.legacy_source', %s, false)", (legacy_source,))
+
+        for migration in list_migrations():
+            version = migration['version']
+            if target is not None and version > target:
+                break
+            if version in applied:
+                if applied[version] != migration['checksum']:
+                    print(f"[WARN] Migration {version:03d}_{migration['name']} modifiee depuis son application")
+                continue
+
+            print(f"[MIGRATION] {version:03d}_{migration['name']}...")
+            apply_migration(cursor, migration)
+            applied_now.append(version)
+
+        if applied_now:
+            print(f"[OK] {len(applied_now)} migration(s) appliquee(s)")
+        return applied_now
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        cursor.close()
+        conn.autocommit = previous_autocommit
+
+def migration_status(conn):
+    """Lister les migrations avec leur date d'application (None = en attente)"""
+    cursor = conn.cursor()
+    ensure_version_table(cursor)
+    cursor.execute("SELECT version, applied_at FROM schema_migrations")
+    applied = dict(cursor.fetchall())
+    conn.commit()
+    cursor.close()
+    return [(m['version'], m['name'], applied.get(m['version'])) for m in list_migrations()]
+
+# ============================================
+# EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrations du schéma du Data Warehouse")
+    parser.add_argument('--status', action='store_true', help="Afficher les versions appliquées / en attente")
+    parser.add_argument('--target', type=int, default=None, help="Dernière version à appliquer")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**PG_CONFIG)
+    try:
+        if args.status:
+            for version, name, applied_at in migration_status(conn):
+                state = applied_at.strftime('%Y-%m-%d %H:%M:%S') if applied_at else 'en attente'
+                print(f"   {version:03d}_{name} : {state}")
+        else:
+            run_migrations(conn, target=args.target)
+    finally:
+        conn.close()
@@ -0,0 +1,20 @@
+-- Migration 002 : exécutions ETL et checkpoints de reprise
+
+CREATE TABLE IF NOT EXISTS etl_runs (
+    run_id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'running', -- running, completed, failed, interrupted, abandoned
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    last_submission_id VARCHAR(50), -- _id MongoDB de la dernière soumission validée
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    facts_loaded INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT
+);
+
+-- Mode incrémental
+ALTER TABLE etl_runs
+    ADD COLUMN IF NOT EXISTS since TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS watermark TIMESTAMP;
+
+COMMENT ON TABLE etl_runs IS 'Contrôle ETL : exécutions et checkpoints de reprise';
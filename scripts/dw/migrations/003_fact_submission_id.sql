@@ -0,0 +1,7 @@
+-- migration: no-transaction
+-- Migration 003 : clé naturelle des faits (un rechargement ne crée pas de doublon)
+-- Index construit avec CONCURRENTLY : fact_exam_results reste lisible et modifiable
+
+ALTER TABLE fact_exam_results ADD COLUMN IF NOT EXISTS submission_id VARCHAR(50);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_fact_submission_id ON fact_exam_results(submission_id);
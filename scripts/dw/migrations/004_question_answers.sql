@@ -0,0 +1,35 @@
+-- Migration 004 : questions des examens et réponses par question
+
+CREATE TABLE IF NOT EXISTS dim_question (
+    question_key SERIAL PRIMARY KEY,
+    question_id VARCHAR(50) NOT NULL UNIQUE, -- _id MongoDB de la question
+    exam_key INTEGER NOT NULL REFERENCES dim_exam(exam_key),
+    position INTEGER NOT NULL, -- Rang de la question dans l'examen (1 = première)
+    question_text TEXT NOT NULL,
+    question_type VARCHAR(20) NOT NULL, -- multiple_choice, true_false, text
+    points DECIMAL(10,2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_dim_question_exam_key ON dim_question(exam_key);
+
+CREATE TABLE IF NOT EXISTS fact_question_answers (
+    answer_fact_id BIGSERIAL PRIMARY KEY,
+    submission_id VARCHAR(50) NOT NULL,
+    question_key INTEGER NOT NULL REFERENCES dim_question(question_key),
+    exam_key INTEGER NOT NULL REFERENCES dim_exam(exam_key),
+    student_key INTEGER NOT NULL REFERENCES dim_student(student_key),
+    date_key INTEGER NOT NULL REFERENCES dim_date(date_key),
+    answer_text TEXT,
+    points_earned DECIMAL(10,2) NOT NULL,
+    points_possible DECIMAL(10,2) NOT NULL,
+    is_correct BOOLEAN NOT NULL,
+    load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (submission_id, question_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_fqa_question_key ON fact_question_answers(question_key);
+CREATE INDEX IF NOT EXISTS idx_fqa_exam_key ON fact_question_answers(exam_key);
+CREATE INDEX IF NOT EXISTS idx_fqa_student_key ON fact_question_answers(student_key);
+
+COMMENT ON TABLE dim_question IS 'Dimension des questions d''examen';
+COMMENT ON TABLE fact_question_answers IS 'Table de faits : réponses par question';
@@ -0,0 +1,76 @@
+-- Migration 005 : plusieurs bases MongoDB sources (campus)
+-- Chaque ligne porte sa source_key ; les lignes existantes sont rattachées à la source
+-- dw.legacy_source (MONGO_DB, positionnée par le runner de migrations)
+
+CREATE TABLE IF NOT EXISTS dim_source (
+    source_key SERIAL PRIMARY KEY,
+    source_name VARCHAR(100) NOT NULL UNIQUE, -- Nom de la base MongoDB
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+DO $$
+DECLARE
+    legacy_key INTEGER;
+    tagged_table TEXT;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'dim_exam' AND column_name = 'source_key'
+    ) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO dim_source (source_name)
+    VALUES (COALESCE(NULLIF(current_setting('dw.legacy_source', true), ''), 'default'))
+    ON CONFLICT (source_name) DO UPDATE SET source_name = EXCLUDED.source_name
+    RETURNING source_key INTO legacy_key;
+
+    FOREACH tagged_table IN ARRAY ARRAY[
+        'dim_exam', 'dim_student', 'dim_filiere', 'dim_question',
+        'fact_exam_results', 'fact_question_answers'
+    ] LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ADD COLUMN IF NOT EXISTS source_key INTEGER REFERENCES dim_source(source_key)',
+            tagged_table
+        );
+        EXECUTE format('UPDATE %I SET source_key = $1 WHERE source_key IS NULL', tagged_table)
+            USING legacy_key;
+        EXECUTE format('ALTER TABLE %I ALTER COLUMN source_key SET NOT NULL', tagged_table);
+    END LOOP;
+
+    -- Les clés naturelles ne sont uniques qu'au sein d'une source
+    ALTER TABLE dim_exam DROP CONSTRAINT IF EXISTS dim_exam_exam_id_key,
+        ADD CONSTRAINT uq_dim_exam_source UNIQUE (source_key, exam_id);
+    ALTER TABLE dim_student DROP CONSTRAINT IF EXISTS dim_student_student_id_key,
+        ADD CONSTRAINT uq_dim_student_source UNIQUE (source_key, student_id);
+    ALTER TABLE dim_filiere DROP CONSTRAINT IF EXISTS dim_filiere_filiere_id_key,
+        DROP CONSTRAINT IF EXISTS dim_filiere_code_key,
+        ADD CONSTRAINT uq_dim_filiere_source UNIQUE (source_key, filiere_id),
+        ADD CONSTRAINT uq_dim_filiere_code UNIQUE (source_key, code);
+    ALTER TABLE dim_question DROP CONSTRAINT IF EXISTS dim_question_question_id_key,
+        ADD CONSTRAINT uq_dim_question_source UNIQUE (source_key, question_id);
+    -- Faits : l'index (source_key, submission_id) est construit sans verrou par la migration 013
+END $$;
+
+-- Difficulté (p = part moyenne des points obtenus) et discrimination
+-- (corrélation item / pourcentage total de la soumission) par question
+CREATE OR REPLACE VIEW vw_question_difficulty AS
+SELECT
+    q.question_key,
+    q.exam_key,
+    e.title AS exam_title,
+    q.position,
+    q.question_text,
+    q.question_type,
+    q.points,
+    COUNT(a.answer_fact_id) AS total_answers,
+    COUNT(CASE WHEN a.is_correct THEN 1 END) AS correct_count,
+    ROUND(AVG(a.points_earned / NULLIF(a.points_possible, 0)), 4) AS difficulty_index,
+    ROUND(CORR(a.points_earned::FLOAT8, f.percentage::FLOAT8)::NUMERIC, 4) AS discrimination_index
+FROM dim_question q
+JOIN dim_exam e ON e.exam_key = q.exam_key
+LEFT JOIN fact_question_answers a ON a.question_key = q.question_key
+LEFT JOIN fact_exam_results f ON f.source_key = a.source_key AND f.submission_id = a.submission_id
+GROUP BY q.question_key, q.exam_key, e.title, q.position, q.question_text, q.question_type, q.points;
+
+COMMENT ON TABLE dim_source IS 'Dimension des sources (bases MongoDB par campus)';
@@ -0,0 +1,59 @@
+-- Migration 006 : enseignants et publications de cours / TP
+
+CREATE TABLE IF NOT EXISTS dim_teacher (
+    teacher_key SERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    teacher_id VARCHAR(50) NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    specialization VARCHAR(255),
+    teacher_number VARCHAR(50),
+    hire_date DATE,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    CONSTRAINT uq_dim_teacher_source UNIQUE (source_key, teacher_id)
+);
+
+CREATE TABLE IF NOT EXISTS fact_publications (
+    publication_id SERIAL PRIMARY KEY,
+    source_key INTEGER NOT NULL REFERENCES dim_source(source_key),
+    content_type VARCHAR(10) NOT NULL, -- course, tp
+    content_id VARCHAR(50) NOT NULL, -- _id MongoDB du cours ou du TP
+    teacher_key INTEGER NOT NULL REFERENCES dim_teacher(teacher_key),
+    filiere_key INTEGER NOT NULL REFERENCES dim_filiere(filiere_key),
+    date_key INTEGER NOT NULL REFERENCES dim_date(date_key), -- Date de publication (à défaut, de création)
+    title VARCHAR(255) NOT NULL,
+    file_name VARCHAR(255),
+    file_type VARCHAR(100),
+    file_size BIGINT, -- Octets
+    is_published BOOLEAN NOT NULL DEFAULT FALSE,
+    published_at TIMESTAMP,
+    deadline TIMESTAMP, -- TP uniquement
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP,
+    load_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_fact_publication_source UNIQUE (source_key, content_type, content_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_fpub_teacher_key ON fact_publications(teacher_key);
+CREATE INDEX IF NOT EXISTS idx_fpub_filiere_key ON fact_publications(filiere_key);
+CREATE INDEX IF NOT EXISTS idx_fpub_date_key ON fact_publications(date_key);
+
+-- Vue : Cours et TP publiés par filière
+CREATE OR REPLACE VIEW vw_filiere_publications AS
+SELECT
+    fil.filiere_key,
+    fil.name AS filiere_name,
+    fil.code AS filiere_code,
+    COUNT(CASE WHEN p.content_type = 'course' THEN 1 END) AS total_courses,
+    COUNT(CASE WHEN p.content_type = 'tp' THEN 1 END) AS total_tps,
+    COUNT(CASE WHEN p.is_published THEN 1 END) AS published_count,
+    COUNT(DISTINCT p.teacher_key) AS total_teachers,
+    MAX(p.published_at) AS last_published_at
+FROM dim_filiere fil
+LEFT JOIN fact_publications p ON p.filiere_key = fil.filiere_key
+GROUP BY fil.filiere_key, fil.name, fil.code;
+
+COMMENT ON TABLE dim_teacher IS 'Dimension des enseignants';
+COMMENT ON TABLE fact_publications IS 'Table de faits : publications de cours et de TP';
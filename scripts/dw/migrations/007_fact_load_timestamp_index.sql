@@ -0,0 +1,4 @@
+-- migration: no-transaction
+-- Migration 007 : index sur load_timestamp (export Parquet incrémental : faits chargés depuis le dernier export)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_fact_load_timestamp ON fact_exam_results(load_timestamp);
@@ -0,0 +1,11 @@
+-- Migration 008 : index secondaires des faits supprimés pendant un rechargement complet
+-- (définitions conservées jusqu'à leur reconstruction, même si le chargement échoue)
+
+CREATE TABLE IF NOT EXISTS etl_deferred_indexes (
+    index_name VARCHAR(100) PRIMARY KEY,
+    table_name VARCHAR(100) NOT NULL,
+    definition TEXT NOT NULL, -- pg_get_indexdef
+    dropped_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE etl_deferred_indexes IS 'Contrôle ETL : index différés pendant les rechargements complets';
@@ -0,0 +1,77 @@
+-- Migration 009 : distributions de scores précalculées (histogrammes et percentiles)
+-- grain : exam (grain_key = exam_key), filiere (filiere_key), month (AAAAMM)
+
+CREATE TABLE IF NOT EXISTS agg_score_histogram (
+    grain VARCHAR(10) NOT NULL,
+    grain_key INTEGER NOT NULL,
+    bucket_start SMALLINT NOT NULL, -- Borne basse du pourcentage (incluse)
+    bucket_end SMALLINT NOT NULL, -- Borne haute (exclue, sauf 100 dans le dernier intervalle)
+    submissions INTEGER NOT NULL,
+    PRIMARY KEY (grain, grain_key, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS agg_score_percentiles (
+    grain VARCHAR(10) NOT NULL,
+    grain_key INTEGER NOT NULL,
+    submissions INTEGER NOT NULL,
+    avg_percentage DECIMAL(5,2) NOT NULL,
+    p10 DECIMAL(5,2) NOT NULL,
+    p25 DECIMAL(5,2) NOT NULL,
+    median DECIMAL(5,2) NOT NULL,
+    p75 DECIMAL(5,2) NOT NULL,
+    p90 DECIMAL(5,2) NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (grain, grain_key)
+);
+
+-- Dernier fait intégré aux distributions (les suivants forment le delta du prochain rafraîchissement)
+CREATE TABLE IF NOT EXISTS agg_refresh_state (
+    aggregate_name VARCHAR(50) PRIMARY KEY,
+    last_fact_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Vue : Percentiles par examen, filière et mois
+CREATE OR REPLACE VIEW vw_score_percentiles AS
+SELECT
+    p.grain,
+    p.grain_key,
+    CASE p.grain
+        WHEN 'exam' THEN e.title
+        WHEN 'filiere' THEN fil.name
+        ELSE TO_CHAR(TO_DATE(p.grain_key::TEXT, 'YYYYMM'), 'YYYY-MM')
+    END AS grain_label,
+    p.submissions,
+    p.avg_percentage,
+    p.p10,
+    p.p25,
+    p.median,
+    p.p75,
+    p.p90,
+    p.refreshed_at
+FROM agg_score_percentiles p
+LEFT JOIN dim_exam e ON p.grain = 'exam' AND e.exam_key = p.grain_key
+LEFT JOIN dim_filiere fil ON p.grain = 'filiere' AND fil.filiere_key = p.grain_key;
+
+-- Vue : Histogrammes des pourcentages par examen, filière et mois
+CREATE OR REPLACE VIEW vw_score_histogram AS
+SELECT
+    h.grain,
+    h.grain_key,
+    CASE h.grain
+        WHEN 'exam' THEN e.title
+        WHEN 'filiere' THEN fil.name
+        ELSE TO_CHAR(TO_DATE(h.grain_key::TEXT, 'YYYYMM'), 'YYYY-MM')
+    END AS grain_label,
+    h.bucket_start,
+    h.bucket_end,
+    h.bucket_start || '-' || h.bucket_end AS bucket_label,
+    h.submissions,
+    ROUND(h.submissions::NUMERIC / NULLIF(SUM(h.submissions) OVER (PARTITION BY h.grain, h.grain_key), 0) * 100, 2) AS share_pct
+FROM agg_score_histogram h
+LEFT JOIN dim_exam e ON h.grain = 'exam' AND e.exam_key = h.grain_key
+LEFT JOIN dim_filiere fil ON h.grain = 'filiere' AND fil.filiere_key = h.grain_key;
+
+COMMENT ON TABLE agg_score_histogram IS 'Agrégat : histogramme des pourcentages (intervalles fixes) par examen, filière et mois';
+COMMENT ON TABLE agg_score_percentiles IS 'Agrégat : percentiles des pourcentages par examen, filière et mois';
+COMMENT ON TABLE agg_refresh_state IS 'Contrôle ETL : dernier fait intégré à chaque agrégat';
@@ -0,0 +1,4 @@
+-- migration: no-transaction
+-- Migration 010 : index sur le mois des faits (recalcul des percentiles des mois modifiés)
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_fact_month ON fact_exam_results((date_key / 100));
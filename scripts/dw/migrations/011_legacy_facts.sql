@@ -0,0 +1,15 @@
+-- Migration 011 : faits chargés avant la clé naturelle submission_id (migration 003)
+-- Ces lignes ont submission_id NULL : l'index unique ne les voit pas, et la prochaine
+-- exécution insérerait une seconde copie de chaque soumission. Elles sont supprimées,
+-- et la prochaine exécution est forcée en chargement complet pour les recharger.
+
+-- Plus de borne incrémentale ni de reprise de chunk tant que des faits hérités existent
+UPDATE etl_runs SET watermark = NULL
+WHERE EXISTS (SELECT 1 FROM fact_exam_results WHERE submission_id IS NULL);
+
+UPDATE etl_runs SET status = 'abandoned', updated_at = CURRENT_TIMESTAMP
+WHERE status IN ('running', 'failed', 'interrupted')
+  AND EXISTS (SELECT 1 FROM fact_exam_results WHERE submission_id IS NULL);
+
+-- Soumissions déjà rechargées depuis la migration 003 : seule la copie avec submission_id reste
+DELETE FROM fact_exam_results WHERE submission_id IS NULL;
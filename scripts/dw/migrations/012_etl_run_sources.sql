@@ -0,0 +1,15 @@
+-- Migration 012 : exécutions ETL rattachées à une source (dim_source) et à un moteur
+-- Reprise et abandon sont filtrés par source et moteur, le watermark incrémental par source :
+-- une exécution d'un campus ne reprend ni ne décale plus celles d'un autre
+
+ALTER TABLE etl_runs
+    ADD COLUMN IF NOT EXISTS source_key INTEGER REFERENCES dim_source(source_key),
+    ADD COLUMN IF NOT EXISTS engine VARCHAR(20) NOT NULL DEFAULT 'chunked'; -- chunked, multi_source
+
+-- Exécutions antérieures : rattachées à la source historique (dw.legacy_source)
+UPDATE etl_runs r SET source_key = s.source_key
+FROM dim_source s
+WHERE r.source_key IS NULL
+  AND s.source_name = COALESCE(NULLIF(current_setting('dw.legacy_source', true), ''), 'default');
+
+CREATE INDEX IF NOT EXISTS idx_etl_runs_source ON etl_runs(source_key, engine, status);
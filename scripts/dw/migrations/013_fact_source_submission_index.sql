@@ -0,0 +1,9 @@
+-- migration: no-transaction
+-- Migration 013 : clé naturelle des faits par source (source_key, submission_id)
+-- Construite sans bloquer les écritures sur fact_exam_results, puis l'index de la
+-- migration 003 (submission_id seul) est supprimé. ON CONFLICT (source_key, submission_id)
+-- retrouve l'index par ses colonnes : le changement de nom est sans effet sur l'ETL.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_fact_source_submission ON fact_exam_results(source_key, submission_id);
+
+DROP INDEX CONCURRENTLY IF EXISTS uq_fact_submission_id;
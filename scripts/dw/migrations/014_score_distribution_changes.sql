@@ -0,0 +1,43 @@
+-- Migration 014 : distributions de scores et faits modifiés ou supprimés
+-- Depuis l'upsert des soumissions modifiées, un fait déjà intégré peut changer de
+-- pourcentage, d'examen, de filière ou de mois : le trigger note les groupes touchés
+-- (anciennes et nouvelles valeurs), recalculés au prochain rafraîchissement.
+
+-- Nombre de faits intégrés (fact_id <= last_fact_id) : un écart avec COUNT(*) signale
+-- des faits supprimés ou rechargés, et impose un recalcul complet (NULL : inconnu)
+ALTER TABLE agg_refresh_state ADD COLUMN IF NOT EXISTS facts_counted BIGINT;
+
+CREATE TABLE IF NOT EXISTS agg_dirty_groups (
+    grain VARCHAR(10) NOT NULL,
+    grain_key INTEGER NOT NULL,
+    PRIMARY KEY (grain, grain_key)
+);
+
+CREATE OR REPLACE FUNCTION mark_score_groups_dirty() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO agg_dirty_groups (grain, grain_key)
+    SELECT DISTINCT g.grain, g.grain_key
+    FROM (
+        SELECT exam_key, filiere_key, date_key FROM old_rows
+        UNION
+        SELECT exam_key, filiere_key, date_key FROM new_rows
+    ) f
+    CROSS JOIN LATERAL (VALUES
+        ('exam', f.exam_key),
+        ('filiere', f.filiere_key),
+        ('month', f.date_key / 100)
+    ) AS g(grain, grain_key)
+    ON CONFLICT (grain, grain_key) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger par instruction : une exécution par instruction INSERT ... ON CONFLICT (load_facts
+-- envoie chaque chunk, ou chaque tranche du chargement parallèle, en une seule instruction)
+DROP TRIGGER IF EXISTS trg_fact_score_groups_dirty ON fact_exam_results;
+CREATE TRIGGER trg_fact_score_groups_dirty
+    AFTER UPDATE ON fact_exam_results
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE mark_score_groups_dirty();
+
+COMMENT ON TABLE agg_dirty_groups IS 'Contrôle ETL : groupes des distributions touchés par des faits modifiés';
@@ -0,0 +1,14 @@
+-- Migration 015 : attributs des dates insérées par l'ETL Python avant dim_date_insert
+-- (trimestre calculé par mois // 4 + 1, fins de mois / trimestre / année toujours à faux)
+
+UPDATE dim_date SET
+    quarter = EXTRACT(QUARTER FROM date),
+    is_month_end = date = (DATE_TRUNC('month', date) + INTERVAL '1 month' - INTERVAL '1 day')::DATE,
+    is_quarter_end = date = (DATE_TRUNC('quarter', date) + INTERVAL '3 months' - INTERVAL '1 day')::DATE,
+    is_year_end = date = (DATE_TRUNC('year', date) + INTERVAL '1 year' - INTERVAL '1 day')::DATE
+WHERE (quarter, is_month_end, is_quarter_end, is_year_end) IS DISTINCT FROM (
+    EXTRACT(QUARTER FROM date)::INTEGER,
+    date = (DATE_TRUNC('month', date) + INTERVAL '1 month' - INTERVAL '1 day')::DATE,
+    date = (DATE_TRUNC('quarter', date) + INTERVAL '3 months' - INTERVAL '1 day')::DATE,
+    date = (DATE_TRUNC('year', date) + INTERVAL '1 year' - INTERVAL '1 day')::DATE
+);
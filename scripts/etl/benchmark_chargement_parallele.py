@@ -0,0 +1,102 @@
+"""
+Benchmark du chargement parallèle des faits : débit (faits/s) selon le nombre
+de connexions PostgreSQL utilisées par load_facts_parallel.
+
+Les faits synthétiques sont chargés dans une table de travail UNLOGGED
+(copie de fact_exam_results sans clés étrangères), supprimée à la fin.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from etl_mongodb_to_dw import (
+    get_postgres_connection,
+    get_postgres_pool,
+    ensure_etl_schema,
+    get_or_create_source,
+    MONGO_DB,
+    load_facts,
+    load_facts_parallel,
+)
+
+BENCH_TABLE = 'bench_fact_exam_results'
+
+def generate_facts(count):
+    """Générer des faits synthétiques (clés arbitraires, pas de clés étrangères)"""
+    now = datetime.now()
+    facts = []
+    for i in range(count):
+        score = random.uniform(0, 20)
+        facts.append({
+            'submission_id': f"bench{i:019d}",
+            'exam_key': random.randint(1, 200),
+            'student_key': random.randint(1, 5000),
+            'filiere_key': random.randint(1, 20),
+            'date_key': 20240101,
+            'score': score,
+            'total_points': 20.0,
+            'percentage': score * 5,
+            'passed': score >= 10,
+            'duration_minutes': 60,
+            'time_taken_minutes': random.randint(5, 60),
+            'certificate_generated': False,
+            'created_at': now,
+            'submitted_at': now
+        })
+    return facts
+
+def reset_bench_table(conn):
+    """(Re)créer la table de travail du benchmark"""
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE UNLOGGED TABLE {BENCH_TABLE}
+        (LIKE fact_exam_results INCLUDING DEFAULTS INCLUDING INDEXES)
+    """)
+    conn.commit()
+    cursor.close()
+
+def run_benchmark(rows, workers_list):
+    """Mesurer le débit pour chaque nombre de connexions"""
+    conn = get_postgres_connection()
+    pool = get_postgres_pool(max(workers_list))
+    facts = generate_facts(rows)
+    results = []
+
+    ensure_etl_schema(conn)
+    source_key = get_or_create_source(conn, MONGO_DB)
+
+    try:
+        for workers in workers_list:
+            reset_bench_table(conn)
+            start = time.perf_counter()
+            if workers == 1:
+                load_facts(conn, facts, source_key, with_dates=False, table=BENCH_TABLE)
+            else:
+                load_facts_parallel(pool, facts, source_key, workers, table=BENCH_TABLE)
+            elapsed = time.perf_counter() - start
+            results.append((workers, elapsed, rows / elapsed))
+    finally:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.commit()
+        cursor.close()
+        conn.close()
+        pool.closeall()
+
+    print("\n" + "="*60)
+    print(f"DEBIT DU CHARGEMENT DES FAITS ({rows} faits)")
+    print("="*60)
+    base = results[0][2]
+    for workers, elapsed, throughput in results:
+        print(f"  N={workers:<3} {elapsed:8.2f}s  {throughput:12.0f} faits/s  x{throughput / base:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du chargement parallèle des faits")
+    parser.add_argument('--rows', type=int, default=200000, help="Nombre de faits synthétiques")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Nombres de connexions à tester")
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.workers)
@@ -0,0 +1,256 @@
+"""
+Moteur ETL asyncio : extraction, transformation et chargement en étapes concurrentes
+reliées par des files bornées (backpressure), pour que la durée totale tende vers
+celle de l'étape la plus lente plutôt que vers la somme des étapes.
+
+Les appels pymongo / psycopg2 (bloquants) sont déportés dans des threads ;
+les chunks et les checkpoints de etl_mongodb_to_dw.py sont conservés. Les réponses
+par question ($unwind, la lecture MongoDB la plus lourde) ont leur propre étape, entre
+la transformation et le chargement : elles circulent lot par lot (au plus
+ETL_ANSWER_QUEUE_SIZE lots en attente), jamais par chunk entier.
+La préférence de lecture MongoDB (MONGO_READ_PREFERENCE) s'applique ; la lecture snapshot
+(--snapshot) reste propre au moteur séquentiel, une session MongoDB ne pouvant pas servir
+à plusieurs étapes concurrentes.
+"""
+
+import asyncio
+import argparse
+import time
+import os
+
+from etl_mongodb_to_dw import (
+    ETL_CHUNK_SIZE,
+    ETL_LOAD_WORKERS,
+    ETL_PARQUET_DIR,
+    ETL_DEFER_INDEXES,
+    MONGO_DB,
+    get_mongo_connection,
+    get_postgres_connection,
+    get_postgres_pool,
+    extract_submissions_chunk,
+    extract_question_answers,
+    transform_submissions,
+    prepare_dimensions,
+    open_run,
+    close_run,
+    abort_run,
+    add_run_arguments,
+    load_chunk_facts,
+    copy_answer_batch,
+    merge_question_answers,
+    save_chunk_checkpoint,
+)
+from etl_mappings import load_mapped_subjects
+
+# Nombre de chunks en attente entre deux étapes (au-delà, l'étape amont attend)
+ETL_QUEUE_SIZE = int(os.getenv('ETL_QUEUE_SIZE', '4'))
+
+# Nombre de lots de réponses (ETL_ANSWER_BATCH_SIZE lignes) en attente du chargement
+ETL_ANSWER_QUEUE_SIZE = int(os.getenv('ETL_ANSWER_QUEUE_SIZE', '2'))
+
+# Marqueur de fin de flux entre les étapes
+END_OF_STREAM = None
+
+# ============================================
+# UTILITAIRES
+# ============================================
+
+async def run_in_thread(func, *args, **kwargs):
+    """Exécuter un appel bloquant dans le pool de threads par défaut"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+class StageTimer:
+    """Mesurer le temps actif (hors attente des files) de chaque étape"""
+
+    def __init__(self):
+        self.busy = {'extract': 0.0, 'transform': 0.0, 'answers': 0.0, 'load': 0.0}
+
+    async def timed(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await run_in_thread(func, *args, **kwargs)
+        finally:
+            self.busy[stage] += time.perf_counter() - start
+
+# ============================================
+# ETAPES DU PIPELINE
+# ============================================
+
+async def extract_stage(mongo_db, after_id, since, chunk_size, out_queue, timer):
+    """Lire les soumissions par chunks et les pousser dans la file de transformation"""
+    while True:
+        chunk = await timer.timed('extract', extract_submissions_chunk, mongo_db, after_id, chunk_size, since)
+        if not chunk:
+            break
+        after_id = str(chunk[-1]['_id'])
+        await out_queue.put(chunk)
+    await out_queue.put(END_OF_STREAM)
+
+async def transform_stage(after_id, dimensions_task, in_queue, out_queue, timer):
+    """Transformer les chunks en faits dès que les clés des dimensions sont disponibles"""
+    exams_dict, students_dict, filieres_dict, questions_dict = await dimensions_task
+    while True:
+        chunk = await in_queue.get()
+        if chunk is END_OF_STREAM:
+            break
+        facts = await timer.timed(
+            'transform', transform_submissions,
+            chunk, exams_dict, students_dict, filieres_dict
+        )
+        last_id = str(chunk[-1]['_id'])
+        await out_queue.put((facts, after_id, last_id, questions_dict))
+        after_id = last_id
+    await out_queue.put(END_OF_STREAM)
+
+async def answers_stage(mongo_db, since, in_queue, out_queue, timer):
+    """Lire les réponses ($unwind) de chaque chunk pendant le chargement, lot par lot
+
+    File de sortie : ('chunk', faits, questions), puis ('answers', lot) pour chaque lot,
+    puis ('commit', dernier _id) ; elle est bornée en lots, pas en chunks.
+    """
+    while True:
+        item = await in_queue.get()
+        if item is END_OF_STREAM:
+            break
+        facts, after_id, last_id, questions_dict = item
+        await out_queue.put(('chunk', facts, questions_dict))
+        if facts:
+            batches = extract_question_answers(mongo_db, after_id, last_id, since=since)
+            while True:
+                batch = await timer.timed('answers', next, batches, None)
+                if batch is None:
+                    break
+                await out_queue.put(('answers', batch))
+        await out_queue.put(('commit', last_id))
+    await out_queue.put(END_OF_STREAM)
+
+async def load_stage(pg_conn, run, in_queue, timer, pool=None, workers=1):
+    """Charger les faits puis chaque lot de réponses d'un chunk dans sa transaction,
+    et valider le checkpoint à la fin du chunk, dans l'ordre"""
+    source_key = run['source_key']
+    while True:
+        item = await in_queue.get()
+        if item is END_OF_STREAM:
+            break
+        if item[0] == 'chunk':
+            _, facts, questions_dict = item
+            facts_by_submission = {fact['submission_id']: fact for fact in facts}
+            copied = 0
+            await timer.timed('load', load_chunk_facts, pg_conn, run, facts, pool, workers)
+        elif item[0] == 'answers':
+            copied += await timer.timed(
+                'load', copy_answer_batch, pg_conn, item[1],
+                questions_dict, facts_by_submission, source_key
+            )
+        else:
+            if facts:
+                await timer.timed('load', merge_question_answers, pg_conn, facts_by_submission, source_key, copied)
+            await timer.timed('load', save_chunk_checkpoint, pg_conn, run, facts, item[1])
+
+async def run_pipeline(mongo_db, pg_conn, run, chunk_size, queue_size, pool=None, workers=1):
+    """Lancer les quatre étapes en parallèle ; la première erreur annule les autres"""
+    timer = StageTimer()
+    raw_queue = asyncio.Queue(maxsize=queue_size)
+    facts_queue = asyncio.Queue(maxsize=queue_size)
+    answers_queue = asyncio.Queue(maxsize=ETL_ANSWER_QUEUE_SIZE)
+
+    # Les dimensions se chargent pendant que l'extraction des soumissions démarre
+    dimensions_task = asyncio.ensure_future(
+        run_in_thread(prepare_dimensions, mongo_db, pg_conn, run['source_key'], since=run['since'])
+    )
+    tasks = [
+        asyncio.ensure_future(extract_stage(
+            mongo_db, run['last_submission_id'], run['since'], chunk_size, raw_queue, timer
+        )),
+        asyncio.ensure_future(transform_stage(
+            run['last_submission_id'], dimensions_task, raw_queue, facts_queue, timer
+        )),
+        asyncio.ensure_future(answers_stage(mongo_db, run['since'], facts_queue, answers_queue, timer)),
+        asyncio.ensure_future(load_stage(pg_conn, run, answers_queue, timer, pool, workers)),
+    ]
+
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        if task.exception():
+            raise task.exception()
+
+    return timer.busy
+
+# ============================================
+# FONCTION PRINCIPALE ETL ASYNC
+# ============================================
+
+def run_etl_async(resume=True, chunk_size=ETL_CHUNK_SIZE, queue_size=ETL_QUEUE_SIZE,
+                  load_workers=ETL_LOAD_WORKERS, incremental=False, parquet_dir=ETL_PARQUET_DIR,
+                  defer_indexes=ETL_DEFER_INDEXES):
+    """Exécuter l'ETL avec le moteur asyncio (mêmes checkpoints et verrou que run_etl)"""
+    print("\n" + "="*50)
+    print("[ETL-ASYNC] DEMARRAGE DU PROCESSUS ETL (PIPELINE CONCURRENT)")
+    print("="*50)
+
+    mongo_db = get_mongo_connection()
+    pg_conn = get_postgres_connection()
+
+    runs = open_run(pg_conn, [MONGO_DB], resume=resume, incremental=incremental,
+                    defer_indexes=defer_indexes)
+    if runs is None:
+        mongo_db.client.close()
+        pg_conn.close()
+        return None
+    run = runs[MONGO_DB]
+    pg_pool = get_postgres_pool(load_workers) if load_workers > 1 else None
+
+    try:
+        start = time.perf_counter()
+        busy = asyncio.run(run_pipeline(
+            mongo_db, pg_conn, run, chunk_size, queue_size, pg_pool, load_workers
+        ))
+        load_mapped_subjects(mongo_db, pg_conn, run['source_key'], run['since'])
+        close_run(pg_conn, [run], parquet_dir)
+        elapsed = time.perf_counter() - start
+
+    except Exception as e:
+        abort_run(pg_conn, [run], e)
+        print(f" [CHECKPOINT] Reprise possible apres le chunk {run['chunks_done']}")
+        raise
+    else:
+        print("\n" + "="*50)
+        print(" PROCESSUS ETL TERMINÉ AVEC SUCCÈS")
+        print(f" {run['facts_loaded']} faits charges en {run['chunks_done']} chunks")
+        print(f" Duree totale : {elapsed:.1f}s (somme des etapes : {sum(busy.values()):.1f}s)")
+        for stage, seconds in busy.items():
+            print(f"   - {stage} : {seconds:.1f}s actif")
+        print("="*50)
+        return run
+    finally:
+        mongo_db.client.close()
+        pg_conn.close()
+        if pg_pool is not None:
+            pg_pool.closeall()
+        print("\n[CLOSE] Connexions fermees")
+
+# ============================================
+# EXECUTION
+# ============================================
+
+def parse_args():
+    """Lire les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="ETL MongoDB -> Data Warehouse (moteur asyncio)")
+    add_run_arguments(parser, 'restart', 'chunk-size')
+    parser.add_argument('--queue-size', type=int, default=ETL_QUEUE_SIZE,
+                        help="Nombre de chunks en attente entre deux étapes")
+    add_run_arguments(parser, 'load-workers', 'incremental', 'parquet-dir', 'defer-indexes')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_etl_async(
+        resume=not args.restart, chunk_size=args.chunk_size,
+        queue_size=args.queue_size, load_workers=args.load_workers,
+        incremental=args.incremental, parquet_dir=args.parquet_dir,
+        defer_indexes=args.defer_indexes
+    )
@@ -0,0 +1,227 @@
+"""
+Mappings déclaratifs MongoDB -> schéma en étoile, et moteur générique qui les exécute.
+
+Un mapping décrit une collection source et sa table cible :
+- table, collection, filtre MongoDB
+- columns : colonne cible -> (chemin MongoDB, type[, défaut]) ; types : str, lower, int, float, bool, datetime
+- natural_key : colonnes uniques avec source_key (cible de ON CONFLICT)
+- constants : colonnes à valeur fixe
+- lookups : colonne cible -> (dimension, colonne naturelle, chemin MongoDB), résolue en clé de substitution
+- date_key : chemins de dates (la première renseignée donne la clé dim_date)
+
+Le moteur extrait par lots (projection + curseur), transforme chaque lot en colonnes
+pandas (conversions vectorisées) et charge par COPY dans une table temporaire suivie
+d'un INSERT ... ON CONFLICT DO UPDATE. Ajouter un domaine = ajouter une entrée à MAPPINGS
+(et une migration créant sa table).
+"""
+
+import io
+
+import pandas as pd
+
+from etl_mongodb_to_dw import ETL_CHUNK_SIZE, load_dim_dates
+
+# Marqueur NULL des lots COPY
+CSV_NULL = '\\N'
+
+def publication_mapping(collection, content_type, extra_columns=None):
+    """Mapping d'une collection de contenus pédagogiques (mêmes champs pour cours et TP)"""
+    columns = {
+        'content_id': ('_id', 'str'),
+        'title': ('title', 'str'),
+        'file_name': ('fileName', 'str'),
+        'file_type': ('fileType', 'str', 'application/pdf'),
+        'file_size': ('fileSize', 'int'),
+        'is_published': ('isPublished', 'bool', False),
+        'published_at': ('publishedAt', 'datetime'),
+        'created_at': ('createdAt', 'datetime'),
+        'updated_at': ('updatedAt', 'datetime'),
+    }
+    columns.update(extra_columns or {})
+    return {
+        'table': 'fact_publications',
+        'collection': collection,
+        'natural_key': ['content_type', 'content_id'],
+        'constants': {'content_type': content_type},
+        'columns': columns,
+        'lookups': {
+            'teacher_key': ('dim_teacher', 'teacher_id', 'teacher'),
+            'filiere_key': ('dim_filiere', 'filiere_id', 'filiere'),
+        },
+        'date_key': ['publishedAt', 'createdAt'],
+    }
+
+# Ordre d'exécution : une dimension avant les faits qui la référencent
+MAPPINGS = [
+    {
+        'table': 'dim_teacher',
+        'collection': 'users',
+        'filter': {'role': 'teacher'},
+        'natural_key': ['teacher_id'],
+        'columns': {
+            'teacher_id': ('_id', 'str'),
+            'username': ('username', 'str'),
+            'email': ('email', 'lower'),
+            'first_name': ('teacherInfo.firstName', 'str'),
+            'last_name': ('teacherInfo.lastName', 'str'),
+            'specialization': ('teacherInfo.specialization', 'str'),
+            'teacher_number': ('teacherInfo.teacherNumber', 'str'),
+            'hire_date': ('teacherInfo.hireDate', 'datetime'),
+            'is_active': ('isActive', 'bool', True),
+        },
+    },
+    publication_mapping('courses', 'course'),
+    publication_mapping('tps', 'tp', {'deadline': ('deadline', 'datetime')}),
+]
+
+# ============================================
+# EXTRACTION
+# ============================================
+
+def source_paths(mapping):
+    """Chemins MongoDB lus par un mapping"""
+    paths = {spec[0] for spec in mapping['columns'].values()}
+    paths.update(path for _, _, path in mapping.get('lookups', {}).values())
+    paths.update(mapping.get('date_key', []))
+    return sorted(paths)
+
+def extract_mapping(db, mapping, since=None, batch_size=ETL_CHUNK_SIZE, session=None):
+    """Lire la collection d'un mapping par lots (champs projetés uniquement)"""
+    query = dict(mapping.get('filter', {}))
+    if since:
+        query['updatedAt'] = {'$gte': since}
+    projection = {path: 1 for path in source_paths(mapping)}
+
+    batch = []
+    for doc in db[mapping['collection']].find(query, projection, session=session).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ============================================
+# TRANSFORMATION (VECTORISEE)
+# ============================================
+
+def coerce(series, kind):
+    """Convertir une colonne entière vers le type cible"""
+    if kind == 'str':
+        return series.astype('string').str.strip()
+    if kind == 'lower':
+        return series.astype('string').str.strip().str.lower()
+    if kind == 'int':
+        return pd.to_numeric(series, errors='coerce').round().astype('Int64')
+    if kind == 'float':
+        return pd.to_numeric(series, errors='coerce')
+    if kind == 'bool':
+        return series.fillna(False).astype(bool)
+    if kind == 'datetime':
+        return pd.to_datetime(series, errors='coerce')
+    raise ValueError(f"Type de mapping inconnu : {kind}")
+
+def load_lookups(conn, mapping, source_key):
+    """Charger les correspondances clé naturelle -> clé de substitution des dimensions référencées"""
+    cursor = conn.cursor()
+    lookups = {}
+    for column, (dimension, natural_column, _) in mapping.get('lookups', {}).items():
+        cursor.execute(
+            f"SELECT {natural_column}, {column} FROM {dimension} WHERE source_key = %s",
+            (source_key,)
+        )
+        lookups[column] = dict(cursor.fetchall())
+    cursor.close()
+    return lookups
+
+def transform_mapping(docs, mapping, lookups):
+    """Transformer un lot de documents en DataFrame aux colonnes de la table cible"""
+    raw = pd.json_normalize(docs).reindex(columns=source_paths(mapping))
+    df = pd.DataFrame(index=raw.index)
+
+    for column, (path, kind, *default) in mapping['columns'].items():
+        series = raw[path].where(raw[path].notna(), default[0]) if default else raw[path]
+        df[column] = coerce(series, kind)
+    for column, value in mapping.get('constants', {}).items():
+        df[column] = value
+    for column, (_, _, path) in mapping.get('lookups', {}).items():
+        df[column] = raw[path].astype('string').map(lookups[column]).astype('Int64')
+
+    date_paths = mapping.get('date_key')
+    if date_paths:
+        dates = pd.to_datetime(raw[date_paths[0]], errors='coerce')
+        for path in date_paths[1:]:
+            dates = dates.fillna(pd.to_datetime(raw[path], errors='coerce'))
+        df['date_key'] = dates.dt.strftime('%Y%m%d').astype('Int64')
+
+    # Lignes dont une référence (dimension, date) est introuvable : écartées
+    required = list(mapping.get('lookups', {})) + (['date_key'] if date_paths else [])
+    complete = df[required].notna().all(axis=1) if required else pd.Series(True, index=df.index)
+    if not complete.all():
+        print(f"   [WARN] {mapping['collection']} : {int((~complete).sum())} document(s) ecarte(s) (reference introuvable)")
+    return df[complete]
+
+# ============================================
+# CHARGEMENT (COPY + UPSERT)
+# ============================================
+
+def copy_frame(cursor, df, staging_table):
+    """Copier un DataFrame dans une table temporaire"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=CSV_NULL)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {staging_table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '{CSV_NULL}')",
+        buffer
+    )
+
+def upsert_staging(cursor, mapping, columns):
+    """Fusionner la table temporaire dans la table cible ; retourne le nombre de lignes écrites"""
+    table = mapping['table']
+    conflict = ['source_key'] + mapping['natural_key']
+    updates = [column for column in columns if column not in conflict]
+    cursor.execute(f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        SELECT {', '.join(columns)} FROM stg_{table}
+        ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in updates)}
+    """)
+    return cursor.rowcount
+
+def run_mapping(db, conn, mapping, source_key, since=None, batch_size=ETL_CHUNK_SIZE, session=None):
+    """Exécuter un mapping : lots extraits -> transformés -> copiés, puis un upsert (une transaction)"""
+    table = mapping['table']
+    print(f"\n[MAPPING] {mapping['collection']} -> {table}...")
+    lookups = load_lookups(conn, mapping, source_key)
+    cursor = conn.cursor()
+    columns = None
+
+    for docs in extract_mapping(db, mapping, since, batch_size, session):
+        df = transform_mapping(docs, mapping, lookups)
+        if df.empty:
+            continue
+        df.insert(0, 'source_key', source_key)
+        if columns is None:
+            columns = list(df.columns)
+            cursor.execute(f"""
+                CREATE TEMP TABLE stg_{table} ON COMMIT DROP AS
+                SELECT {', '.join(columns)} FROM {table} WITH NO DATA
+            """)
+        if 'date_key' in df.columns:
+            load_dim_dates(cursor, [{'date_key': int(key)} for key in df['date_key'].unique()])
+        copy_frame(cursor, df, f"stg_{table}")
+
+    written = upsert_staging(cursor, mapping, columns) if columns else 0
+    conn.commit()
+    cursor.close()
+    print(f"   [OK] {written} ligne(s) ecrite(s) dans {table}")
+    return written
+
+def load_mapped_subjects(db, conn, source_key, since=None, mappings=MAPPINGS, session=None):
+    """Exécuter tous les mappings déclaratifs dans l'ordre (session : lecture snapshot optionnelle)"""
+    return {
+        f"{mapping['collection']}->{mapping['table']}": run_mapping(
+            db, conn, mapping, source_key, since, session=session
+        )
+        for mapping in mappings
+    }
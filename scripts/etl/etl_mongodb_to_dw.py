@@ -5,17 +5,31 @@ Date: 2024
 """
 
 import pymongo
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 import psycopg2
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor
+import time
 from datetime import datetime, timedelta
+import io
+import csv
+import json
 import pandas as pd
 from sqlalchemy import create_engine
 import os
+import argparse
+from bson import ObjectId
 from dotenv import load_dotenv
+import sys
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Runner des migrations du schéma (scripts/dw)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dw'))
+from migrate_schema import run_migrations
+
 # ============================================
 # CONFIGURATION
 # ============================================
@@ -31,21 +45,111 @@ PG_DB = os.getenv('PG_DB', 'datawarehouse')
 PG_USER = os.getenv('PG_USER', 'postgres')
 PG_PASSWORD = os.getenv('PG_PASSWORD', 'password')
 
+# Checkpoints : nombre de soumissions traitées (et validées) par chunk
+ETL_CHUNK_SIZE = int(os.getenv('ETL_CHUNK_SIZE', '5000'))
+
+# Chargement parallèle : nombre de connexions PostgreSQL utilisées pour les faits
+ETL_LOAD_WORKERS = int(os.getenv('ETL_LOAD_WORKERS', '1'))
+
+# Réponses par question : lignes lues du curseur $unwind et envoyées par COPY
+ETL_ANSWER_BATCH_SIZE = int(os.getenv('ETL_ANSWER_BATCH_SIZE', '20000'))
+
+# Verrou consultatif PostgreSQL : une seule instance ETL charge à la fois
+ETL_LOCK_KEY = int(os.getenv('ETL_LOCK_KEY', '730261'))
+
+# Moteurs enregistrés dans etl_runs : checkpoints par chunk (run_etl, run_etl_async)
+# ou une exécution validée d'un bloc par source (etl_multi_source.py)
+ENGINE_CHUNKED = 'chunked'
+ENGINE_MULTI_SOURCE = 'multi_source'
+
+# Incrémental : marge (minutes) retirée au watermark pour absorber les décalages d'horloge
+ETL_INCREMENTAL_MARGIN = int(os.getenv('ETL_INCREMENTAL_MARGIN', '5'))
+
+# Lecture MongoDB : préférence de lecture (primary, primaryPreferred, secondary,
+# secondaryPreferred, nearest) et tags de nœud optionnels ("nodeType:ANALYTICS,region:tn")
+MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+MONGO_READ_TAGS = os.getenv('MONGO_READ_TAGS', '')
+
+# Extraction cohérente : toutes les lectures d'une exécution à la même heure de cluster
+# (read concern snapshot, replica set MongoDB 5.0+)
+ETL_SNAPSHOT_READS = os.getenv('ETL_SNAPSHOT_READS', '0') == '1'
+
+# Export Parquet optionnel après chaque chargement (vide = désactivé)
+ETL_PARQUET_DIR = os.getenv('ETL_PARQUET_DIR') or None
+
+# Rechargement complet : index secondaires des faits supprimés puis reconstruits en parallèle
+ETL_DEFER_INDEXES = os.getenv('ETL_DEFER_INDEXES', '0') == '1'
+ETL_INDEX_WORKERS = int(os.getenv('ETL_INDEX_WORKERS', '4'))
+
 # ============================================
 # CONNEXIONS
 # ============================================
 
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+def parse_read_tags(tags):
+    """Tags de nœud "cle:valeur,cle:valeur" (espaces ignorés autour des clés et valeurs)"""
+    tag_set = {}
+    for tag in tags.split(','):
+        if not tag.strip():
+            continue
+        key, separator, value = tag.partition(':')
+        if not separator or not key.strip() or not value.strip():
+            raise ValueError(f"MONGO_READ_TAGS : tag invalide '{tag.strip()}' (attendu cle:valeur)")
+        tag_set[key.strip()] = value.strip()
+    return tag_set
+
+def get_read_preference(mode=MONGO_READ_PREFERENCE, tags=MONGO_READ_TAGS):
+    """Préférence de lecture MongoDB (les extractions lourdes peuvent viser un secondaire)"""
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Preference de lecture inconnue : {mode} ({', '.join(READ_PREFERENCES)})")
+    if mode == 'primary':
+        return Primary()
+    tag_set = parse_read_tags(tags)
+    # Le tag set vide final autorise tout nœud du mode si aucun ne porte les tags
+    return READ_PREFERENCES[mode](tag_sets=[tag_set, {}] if tag_set else None)
+
+def get_mongo_client():
+    """Client MongoDB avec la préférence de lecture configurée"""
+    return pymongo.MongoClient(MONGO_URI, read_preference=get_read_preference())
+
 def get_mongo_connection():
     """Établir la connexion à MongoDB"""
     try:
-        client = pymongo.MongoClient(MONGO_URI)
+        client = get_mongo_client()
         db = client[MONGO_DB]
-        print(f"Connexion MongoDB réussie : {MONGO_DB}")
+        print(f"Connexion MongoDB réussie : {MONGO_DB} (lecture : {MONGO_READ_PREFERENCE})")
         return db
     except Exception as e:
         print(f" Erreur de connexion MongoDB : {e}")
         raise
 
+# Les lectures d'une exécution par chunks alternent avec les chargements PostgreSQL : une
+# exécution complète dépasse la fenêtre d'historique snapshot du serveur (SnapshotTooOld)
+SNAPSHOT_FULL_RUN = (
+    "--snapshot est reserve aux executions incrementales : une execution complete alterne "
+    "lectures MongoDB et chargements au-dela de minSnapshotHistoryWindowInSeconds (300s par "
+    "defaut), et sa reprise ouvrirait un nouvel instantane. Pour un rechargement complet "
+    "coherent, utiliser etl_multi_source.py --snapshot (extraction complete avant chargement)."
+)
+
+def start_snapshot_session(db):
+    """Session en lecture snapshot : les lectures qui la reçoivent voient toutes
+    la même heure de cluster (fixée par la première lecture)
+
+    Une session ne doit servir qu'à un thread à la fois. La durée de l'extraction
+    doit rester sous minSnapshotHistoryWindowInSeconds (300s par défaut côté serveur).
+    """
+    session = db.client.start_session(snapshot=True)
+    print(f"[SNAPSHOT] Lecture coherente (read concern snapshot, lecture : {MONGO_READ_PREFERENCE})")
+    return session
+
 def get_postgres_connection():
     """Établir la connexion à PostgreSQL"""
     try:
@@ -62,14 +166,35 @@ def get_postgres_connection():
         print(f" Erreur de connexion PostgreSQL : {e}")
         raise
 
+def get_postgres_pool(maxconn):
+    """Créer un pool de connexions PostgreSQL (partageable entre threads)"""
+    try:
+        pool = ThreadedConnectionPool(
+            1, maxconn,
+            host=PG_HOST,
+            port=PG_PORT,
+            database=PG_DB,
+            user=PG_USER,
+            password=PG_PASSWORD
+        )
+        print(f"Pool PostgreSQL cree : {PG_DB} ({maxconn} connexions max)")
+        return pool
+    except Exception as e:
+        print(f" Erreur de creation du pool PostgreSQL : {e}")
+        raise
+
 # ============================================
 # EXTRACTION (EXTRACT)
 # ============================================
 
-def extract_exams(db):
-    """Extraire les examens depuis MongoDB"""
+def modified_since(since):
+    """Filtre MongoDB des documents modifiés depuis since (tous si since est vide)"""
+    return {'updatedAt': {'$gte': since}} if since else {}
+
+def extract_exams(db, session=None, since=None):
+    """Extraire les examens depuis MongoDB (modifiés depuis since en incrémental)"""
     print("\n Extraction des examens...")
-    exams = list(db.exams.find({}))
+    exams = list(db.exams.find(modified_since(since), {'questions': 0}, session=session))
     print(f"  {len(exams)} examens extraits")
     return exams
 
@@ -80,17 +205,97 @@ def extract_submissions(db):
     print(f" {len(submissions)} soumissions extraites")
     return submissions
 
-def extract_students(db):
-    """Extraire les étudiants depuis MongoDB"""
+def extract_submissions_chunk(db, after_id=None, limit=ETL_CHUNK_SIZE, since=None, session=None):
+    """Extraire un chunk de soumissions triées par _id, après la dernière frontière validée
+
+    since : ne garder que les soumissions modifiées depuis cette date (mode incrémental)
+    session : session snapshot (lecture à la même heure de cluster que les dimensions)
+    """
+    query = {'isSubmitted': True}
+    if since:
+        query['updatedAt'] = {'$gte': since}
+    if after_id:
+        query['_id'] = {'$gt': ObjectId(after_id)}
+    # Les réponses sont extraites à part (extract_question_answers)
+    return list(db.examsubmissions.find(query, {'answers': 0}, session=session).sort('_id', 1).limit(limit))
+
+def extract_questions(db, session=None, exam_ids=None):
+    """Extraire les questions des examens ($unwind, une ligne par question)
+
+    exam_ids : ne lire que les questions de ces examens (incrémental)
+    """
+    print("\n Extraction des questions...")
+    match = [{'$match': {'_id': {'$in': exam_ids}}}] if exam_ids is not None else []
+    questions = list(db.exams.aggregate(match + [
+        {'$unwind': {'path': '$questions', 'includeArrayIndex': 'position'}},
+        {'$project': {
+            '_id': 0,
+            'exam_id': '$_id',
+            'position': 1,
+            'question': '$questions'
+        }}
+    ], allowDiskUse=True, session=session))
+    print(f"    {len(questions)} questions extraites")
+    return questions
+
+def extract_question_answers(db, after_id=None, last_id=None, batch_size=ETL_ANSWER_BATCH_SIZE, since=None,
+                             session=None):
+    """Lire en flux les réponses des soumissions d'un chunk (]after_id, last_id]), par lots"""
+    match = {'isSubmitted': True}
+    id_range = {}
+    if last_id:
+        id_range['$lte'] = ObjectId(last_id)
+    if after_id:
+        id_range['$gt'] = ObjectId(after_id)
+    if id_range:
+        match['_id'] = id_range
+    if since:
+        match['updatedAt'] = {'$gte': since}
+    cursor = db.examsubmissions.aggregate([
+        {'$match': match},
+        {'$project': {'answers': 1}},
+        {'$unwind': '$answers'},
+        {'$project': {
+            '_id': 0,
+            'submission_id': '$_id',
+            'question_id': '$answers.questionId',
+            'answer': '$answers.answer',
+            'points': '$answers.points'
+        }}
+    ], allowDiskUse=True, batchSize=batch_size, session=session)
+    
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def submission_student_ids(db, since, session=None):
+    """Étudiants des soumissions modifiées depuis since (leur filière donne celle du fait)"""
+    return db.examsubmissions.distinct(
+        'student', {'isSubmitted': True, 'updatedAt': {'$gte': since}}, session=session
+    )
+
+def extract_students(db, session=None, since=None, student_ids=None):
+    """Extraire les étudiants depuis MongoDB
+
+    since / student_ids (incrémental) : étudiants modifiés depuis since ou cités par les soumissions
+    """
     print("\n Extraction des étudiants...")
-    students = list(db.users.find({'role': 'student'}))
+    query = {'role': 'student'}
+    if since:
+        query['$or'] = [modified_since(since), {'_id': {'$in': student_ids or []}}]
+    students = list(db.users.find(query, session=session))
     print(f"    {len(students)} étudiants extraits")
     return students
 
-def extract_filieres(db):
-    """Extraire les filières depuis MongoDB"""
+def extract_filieres(db, session=None, since=None):
+    """Extraire les filières depuis MongoDB (modifiées depuis since en incrémental)"""
     print("\n Extraction des filières...")
-    filieres = list(db.filieres.find({}))
+    filieres = list(db.filieres.find(modified_since(since), session=session))
     print(f"    {len(filieres)} filières extraites")
     return filieres
 
@@ -162,6 +367,102 @@ def transform_filieres(filieres):
     print(f"   [OK] {len(transformed)} filieres transformees")
     return transformed
 
+def transform_questions(questions, exams_dict):
+    """Transformer les questions (clé d'examen issue de dim_exam)"""
+    print("\n[TRANSFORM] Transformation des questions...")
+    transformed = []
+    
+    for row in questions:
+        exam_data = exams_dict.get(str(row['exam_id']))
+        question = row.get('question', {})
+        if not exam_data or not question.get('_id'):
+            continue
+        
+        transformed.append({
+            'question_id': str(question['_id']),
+            'exam_key': exam_data['exam_key'],
+            'position': int(row.get('position', 0)) + 1,
+            'question_text': question.get('question', '').strip(),
+            'question_type': question.get('type', 'multiple_choice'),
+            'points': float(question.get('points', 1) or 0)
+        })
+    
+    print(f"   [OK] {len(transformed)} questions transformees")
+    return transformed
+
+def transform_question_answers(answers, questions_dict, facts_by_submission):
+    """Transformer les réponses en faits ; seules celles des soumissions chargées sont gardées"""
+    rows = []
+    
+    for ans in answers:
+        fact = facts_by_submission.get(str(ans['submission_id']))
+        question = questions_dict.get(str(ans.get('question_id')))
+        if not fact or not question:
+            continue
+        
+        answer = ans.get('answer')
+        if answer is not None and not isinstance(answer, str):
+            answer = json.dumps(answer, default=str, ensure_ascii=False)
+        
+        points_earned = float(ans.get('points', 0) or 0)
+        points_possible = question['points']
+        rows.append((
+            fact['submission_id'], question['question_key'], fact['exam_key'],
+            fact['student_key'], fact['date_key'], answer,
+            points_earned, points_possible,
+            points_possible > 0 and points_earned >= points_possible
+        ))
+    
+    return rows
+
+def student_filiere_id(student_mongo):
+    """Identifiant MongoDB de la filière d'un étudiant (référence ou document peuplé)"""
+    student_info = student_mongo.get('studentInfo', {}) or {}
+    filiere_ref = student_info.get('filiere')
+    
+    if not filiere_ref:
+        return None
+    if isinstance(filiere_ref, dict):
+        return str(filiere_ref.get('_id', ''))
+    return str(filiere_ref)
+
+def submission_measures(sub):
+    """Mesures d'une soumission : score, pourcentage, temps pris, dates"""
+    # Calculer le temps pris (en minutes)
+    started_at = sub.get('startedAt')
+    submitted_at = sub.get('submittedAt')
+    time_taken_minutes = None
+    
+    if isinstance(started_at, str):
+        started_at = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+    if isinstance(submitted_at, str):
+        submitted_at = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
+    
+    if started_at and submitted_at:
+        time_diff = submitted_at - started_at
+        time_taken_minutes = int(time_diff.total_seconds() / 60)
+    
+    # Calculer le pourcentage si manquant
+    percentage = float(sub.get('percentage', 0))
+    if percentage == 0 and sub.get('totalPoints', 0) > 0:
+        percentage = (float(sub.get('score', 0)) / float(sub.get('totalPoints', 1))) * 100
+    
+    # Date de soumission pour la dimension date
+    submission_date = submitted_at if submitted_at else datetime.now()
+    
+    return {
+        'submission_id': str(sub['_id']),
+        'date_key': int(submission_date.strftime('%Y%m%d')),
+        'score': float(sub.get('score', 0)),
+        'total_points': float(sub.get('totalPoints', 0)),
+        'percentage': percentage,
+        'passed': bool(sub.get('passed', False)),
+        'time_taken_minutes': time_taken_minutes,
+        'certificate_generated': bool(sub.get('certificateGenerated', False)),
+        'created_at': sub.get('createdAt', datetime.now()),
+        'submitted_at': submitted_at if submitted_at else None
+    }
+
 def transform_submissions(submissions, exams_dict, students_dict, filieres_dict):
     """Transformer les soumissions en faits"""
     print("\n[TRANSFORM] Transformation des soumissions...")
@@ -179,64 +480,23 @@ def transform_submissions(submissions, exams_dict, students_dict, filieres_dict)
             continue  # Ignorer si les références sont manquantes
         
         # Récupérer la filière de l'étudiant
-        student_mongo = students_dict.get(student_id, {}).get('_mongo_data', {})
-        student_info = student_mongo.get('studentInfo', {})
-        filiere_ref = student_info.get('filiere')
-        
-        filiere_id = None
-        if filiere_ref:
-            if isinstance(filiere_ref, dict):
-                filiere_id = str(filiere_ref.get('_id', ''))
-            else:
-                filiere_id = str(filiere_ref)
-        
+        filiere_id = student_filiere_id(student_data.get('_mongo_data', {}))
         filiere_key = filieres_dict.get(filiere_id, {}).get('filiere_key')
         
         if not filiere_key:
             continue  # Ignorer si la filière est manquante
         
-        # Calculer le temps pris (en minutes)
-        started_at = sub.get('startedAt')
-        submitted_at = sub.get('submittedAt')
-        time_taken_minutes = None
-        
-        if started_at and submitted_at:
-            if isinstance(started_at, str):
-                started_at = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
-            if isinstance(submitted_at, str):
-                submitted_at = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
-            
-            time_diff = submitted_at - started_at
-            time_taken_minutes = int(time_diff.total_seconds() / 60)
-        
-        # Calculer le pourcentage si manquant
-        percentage = float(sub.get('percentage', 0))
-        if percentage == 0 and sub.get('totalPoints', 0) > 0:
-            percentage = (float(sub.get('score', 0)) / float(sub.get('totalPoints', 1))) * 100
-        
-        # Date de soumission pour la dimension date
-        submission_date = submitted_at if submitted_at else datetime.now()
-        if isinstance(submission_date, str):
-            submission_date = datetime.fromisoformat(submission_date.replace('Z', '+00:00'))
-        
-        date_key = int(submission_date.strftime('%Y%m%d'))
-        
-        facts.append({
+        fact = submission_measures(sub)
+        fact.update({
             'exam_key': exam_data['exam_key'],
             'student_key': student_data['student_key'],
             'filiere_key': filiere_key,
-            'date_key': date_key,
-            'score': float(sub.get('score', 0)),
-            'total_points': float(sub.get('totalPoints', 0)),
-            'percentage': percentage,
-            'passed': bool(sub.get('passed', False)),
-            'duration_minutes': int(exam_data.get('duration', 0)),
-            'time_taken_minutes': time_taken_minutes,
-            'certificate_generated': bool(sub.get('certificateGenerated', False)),
-            'created_at': sub.get('createdAt', datetime.now()),
-            'submitted_at': submitted_at if submitted_at else None
+            'duration_minutes': int(exam_data.get('duration', 0))
         })
+        facts.append(fact)
     
+    if len(facts) < len(submissions):
+        print(f"   [WARN] {len(submissions) - len(facts)} soumission(s) ignoree(s) (examen, etudiant ou filiere introuvable)")
     print(f"   [OK] {len(facts)} faits transformes")
     return facts
 
@@ -244,8 +504,8 @@ def transform_submissions(submissions, exams_dict, students_dict, filieres_dict)
 # CHARGEMENT (LOAD)
 # ============================================
 
-def load_dimensions(conn, exams, students, filieres):
-    """Charger les dimensions dans le DW"""
+def load_dimensions(conn, exams, students, filieres, source_key):
+    """Charger les dimensions dans le DW (clés naturelles préfixées par la source)"""
     cursor = conn.cursor()
     
     # Charger dim_exam
@@ -253,10 +513,10 @@ def load_dimensions(conn, exams, students, filieres):
     for exam in exams:
         cursor.execute("""
             INSERT INTO dim_exam (
-                exam_id, title, description, total_points, min_passing_score,
+                source_key, exam_id, title, description, total_points, min_passing_score,
                 duration, is_published, published_date, created_date, updated_date
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (exam_id) DO UPDATE SET
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (source_key, exam_id) DO UPDATE SET
                 title = EXCLUDED.title,
                 description = EXCLUDED.description,
                 total_points = EXCLUDED.total_points,
@@ -267,7 +527,7 @@ def load_dimensions(conn, exams, students, filieres):
                 updated_date = EXCLUDED.updated_date
             RETURNING exam_key
         """, (
-            exam['exam_id'], exam['title'], exam['description'],
+            source_key, exam['exam_id'], exam['title'], exam['description'],
             exam['total_points'], exam['min_passing_score'],
             exam['duration'], exam['is_published'],
             exam['published_date'], exam['created_date'], exam['updated_date']
@@ -280,10 +540,10 @@ def load_dimensions(conn, exams, students, filieres):
     for student in students:
         cursor.execute("""
             INSERT INTO dim_student (
-                student_id, username, email, first_name, last_name,
+                source_key, student_id, username, email, first_name, last_name,
                 full_name, enrollment_date, student_number
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (student_id) DO UPDATE SET
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (source_key, student_id) DO UPDATE SET
                 username = EXCLUDED.username,
                 email = EXCLUDED.email,
                 first_name = EXCLUDED.first_name,
@@ -293,7 +553,7 @@ def load_dimensions(conn, exams, students, filieres):
                 student_number = EXCLUDED.student_number
             RETURNING student_key
         """, (
-            student['student_id'], student['username'], student['email'],
+            source_key, student['student_id'], student['username'], student['email'],
             student['first_name'], student['last_name'], student['full_name'],
             student['enrollment_date'], student['student_number']
         ))
@@ -306,16 +566,16 @@ def load_dimensions(conn, exams, students, filieres):
     for filiere in filieres:
         cursor.execute("""
             INSERT INTO dim_filiere (
-                filiere_id, name, code, description, duration
-            ) VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (filiere_id) DO UPDATE SET
+                source_key, filiere_id, name, code, description, duration
+            ) VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (source_key, filiere_id) DO UPDATE SET
                 name = EXCLUDED.name,
                 code = EXCLUDED.code,
                 description = EXCLUDED.description,
                 duration = EXCLUDED.duration
             RETURNING filiere_key
         """, (
-            filiere['filiere_id'], filiere['name'], filiere['code'],
+            source_key, filiere['filiere_id'], filiere['name'], filiere['code'],
             filiere['description'], filiere['duration']
         ))
         filiere_key = cursor.fetchone()[0]
@@ -331,58 +591,627 @@ def load_dimensions(conn, exams, students, filieres):
     
     return exams_dict, students_dict, filieres_dict
 
-def load_facts(conn, facts):
-    """Charger les faits dans le DW"""
-    print("\n[LOAD] Chargement de fact_exam_results...")
+def load_dim_question(conn, questions, source_key):
+    """Charger dim_question ; retourner {question_id: {question_key, points}}"""
+    print("\n[LOAD] Chargement de dim_question...")
     cursor = conn.cursor()
     
-    # Vérifier que les dates existent dans dim_date
-    date_keys = set(fact['date_key'] for fact in facts)
-    for date_key in date_keys:
-        date_str = str(date_key)
-        date_obj = datetime(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:8]))
-        cursor.execute("""
-            INSERT INTO dim_date (date_key, date, year, quarter, month, month_name, week, day_of_month, day_of_week, day_name, is_weekend, is_month_end, is_quarter_end, is_year_end)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (date_key) DO NOTHING
-        """, (
-            date_key, date_obj.date(),
-            date_obj.year, date_obj.month // 4 + 1, date_obj.month,
-            date_obj.strftime('%B'), date_obj.isocalendar()[1],
-            date_obj.day, date_obj.weekday() + 1, date_obj.strftime('%A'),
-            date_obj.weekday() >= 5, False, False, False
-        ))
+    rows = execute_values(cursor, """
+        INSERT INTO dim_question (
+            source_key, question_id, exam_key, position, question_text, question_type, points
+        ) VALUES %s
+        ON CONFLICT (source_key, question_id) DO UPDATE SET
+            exam_key = EXCLUDED.exam_key,
+            position = EXCLUDED.position,
+            question_text = EXCLUDED.question_text,
+            question_type = EXCLUDED.question_type,
+            points = EXCLUDED.points
+        RETURNING question_id, question_key, points
+    """, [(
+        source_key, q['question_id'], q['exam_key'], q['position'],
+        q['question_text'], q['question_type'], q['points']
+    ) for q in questions], fetch=True) if questions else []
     
-    # Charger les faits
-    insert_query = """
-        INSERT INTO fact_exam_results (
-            exam_key, student_key, filiere_key, date_key,
+    conn.commit()
+    cursor.close()
+    print(f"   [OK] {len(rows)} questions chargees")
+    return {
+        question_id: {'question_key': question_key, 'points': float(points)}
+        for question_id, question_key, points in rows
+    }
+
+def dim_date_insert(date_keys):
+    """Insertion des lignes dim_date manquantes, commune à tous les moteurs ETL
+
+    date_keys : expression FROM donnant une colonne date_key (AAAAMMJJ)
+    """
+    return f"""
+        INSERT INTO dim_date (
+            date_key, date, year, quarter, month, month_name,
+            week, day_of_month, day_of_week, day_name,
+            is_weekend, is_month_end, is_quarter_end, is_year_end
+        )
+        SELECT
+            date_key, d,
+            EXTRACT(YEAR FROM d), EXTRACT(QUARTER FROM d), EXTRACT(MONTH FROM d),
+            TO_CHAR(d, 'FMMonth'), EXTRACT(WEEK FROM d), EXTRACT(DAY FROM d),
+            EXTRACT(ISODOW FROM d), TO_CHAR(d, 'FMDay'),
+            EXTRACT(ISODOW FROM d) IN (6, 7),
+            d = (DATE_TRUNC('month', d) + INTERVAL '1 month' - INTERVAL '1 day')::DATE,
+            d = (DATE_TRUNC('quarter', d) + INTERVAL '3 months' - INTERVAL '1 day')::DATE,
+            d = (DATE_TRUNC('year', d) + INTERVAL '1 year' - INTERVAL '1 day')::DATE
+        FROM (
+            SELECT DISTINCT date_key, TO_DATE(date_key::TEXT, 'YYYYMMDD') AS d
+            FROM {date_keys}
+        ) dates
+        ON CONFLICT (date_key) DO NOTHING
+    """
+
+def load_dimension_keys(conn, source_key):
+    """Dictionnaires de jointure des examens, filières et questions déjà chargés (DW)"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT exam_id, exam_key, duration FROM dim_exam WHERE source_key = %s", (source_key,)
+    )
+    exams_dict = {
+        exam_id: {'exam_id': exam_id, 'exam_key': exam_key, 'duration': duration or 0}
+        for exam_id, exam_key, duration in cursor.fetchall()
+    }
+    cursor.execute(
+        "SELECT filiere_id, filiere_key FROM dim_filiere WHERE source_key = %s", (source_key,)
+    )
+    filieres_dict = {
+        filiere_id: {'filiere_id': filiere_id, 'filiere_key': filiere_key}
+        for filiere_id, filiere_key in cursor.fetchall()
+    }
+    cursor.execute(
+        "SELECT question_id, question_key, points FROM dim_question WHERE source_key = %s", (source_key,)
+    )
+    questions_dict = {
+        question_id: {'question_key': question_key, 'points': float(points)}
+        for question_id, question_key, points in cursor.fetchall()
+    }
+    conn.commit()
+    cursor.close()
+    return exams_dict, filieres_dict, questions_dict
+
+def load_dim_dates(cursor, facts):
+    """Vérifier que les dates des faits existent dans dim_date"""
+    date_keys = sorted(set(fact['date_key'] for fact in facts))
+    if date_keys:
+        cursor.execute(dim_date_insert("UNNEST(%s::INTEGER[]) AS date_key"), (date_keys,))
+
+# Mesures et clés d'un fait mises à jour quand la soumission change dans MongoDB
+FACT_UPDATE_COLUMNS = [
+    'exam_key', 'student_key', 'filiere_key', 'date_key',
+    'score', 'total_points', 'percentage', 'passed',
+    'duration_minutes', 'time_taken_minutes', 'certificate_generated',
+    'created_at', 'submitted_at'
+]
+
+def fact_upsert_clause(table='fact_exam_results'):
+    """Clause ON CONFLICT des faits : une soumission déjà chargée est mise à jour
+    (nouvelle tentative, certificat généré) ; une ligne inchangée n'est pas réécrite"""
+    return f"""
+        ON CONFLICT (source_key, submission_id) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in FACT_UPDATE_COLUMNS)},
+            load_timestamp = CURRENT_TIMESTAMP
+        WHERE ({', '.join(f'{table}.{column}' for column in FACT_UPDATE_COLUMNS)})
+            IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in FACT_UPDATE_COLUMNS)})
+    """
+
+def load_facts(conn, facts, source_key, commit=True, with_dates=True, table='fact_exam_results'):
+    """Charger les faits dans le DW (commit=False pour valider avec le checkpoint)"""
+    print(f"\n[LOAD] Chargement de {table}...")
+    cursor = conn.cursor()
+    
+    if with_dates:
+        load_dim_dates(cursor, facts)
+    
+    # Charger les faits ((source_key, submission_id) unique : un rechargement ne crée pas de doublon,
+    # une soumission modifiée met à jour son fait)
+    insert_query = f"""
+        INSERT INTO {table} (
+            source_key, submission_id, exam_key, student_key, filiere_key, date_key,
             score, total_points, percentage, passed,
             duration_minutes, time_taken_minutes, certificate_generated,
             created_at, submitted_at
         ) VALUES %s
-        ON CONFLICT DO NOTHING
+        {fact_upsert_clause(table)}
     """
     
     values = [(
+        source_key, fact['submission_id'],
         fact['exam_key'], fact['student_key'], fact['filiere_key'], fact['date_key'],
         fact['score'], fact['total_points'], fact['percentage'], fact['passed'],
         fact['duration_minutes'], fact['time_taken_minutes'], fact['certificate_generated'],
         fact['created_at'], fact['submitted_at']
     ) for fact in facts]
     
-    execute_values(cursor, insert_query, values)
+    # Une seule instruction par appel : le trigger par instruction des faits
+    # (trg_fact_score_groups_dirty) s'exécute une fois par chunk, pas par page de 100 lignes
+    execute_values(cursor, insert_query, values, page_size=max(len(values), 1))
     
-    conn.commit()
+    if commit:
+        conn.commit()
     cursor.close()
     print(f"   [OK] {len(facts)} faits charges")
 
+ANSWER_COLUMNS = (
+    "source_key, submission_id, question_key, exam_key, student_key, date_key, "
+    "answer_text, points_earned, points_possible, is_correct"
+)
+
+def answer_staging_cursor(conn):
+    """Curseur avec la table temporaire des réponses (vidée au commit) disponible"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stg_question_answers
+        (LIKE fact_question_answers INCLUDING DEFAULTS)
+        ON COMMIT DELETE ROWS
+    """)
+    return cursor
+
+def copy_answer_batch(conn, batch, questions_dict, facts_by_submission, source_key):
+    """Copier un lot de réponses dans la table temporaire (COPY), sans commit"""
+    rows = [
+        (source_key,) + row
+        for row in transform_question_answers(batch, questions_dict, facts_by_submission)
+    ]
+    if not rows:
+        return 0
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = answer_staging_cursor(conn)
+    cursor.copy_expert(
+        f"COPY stg_question_answers ({ANSWER_COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+    cursor.close()
+    return len(rows)
+
+def merge_question_answers(conn, facts_by_submission, source_key, copied):
+    """Remplacer les réponses des soumissions du chunk par les lots copiés, sans commit"""
+    cursor = answer_staging_cursor(conn)
+    # Les réponses des soumissions du chunk sont remplacées : une nouvelle tentative
+    # réécrit answers[] dans MongoDB (chunk rejoué : mêmes lignes)
+    cursor.execute(
+        "DELETE FROM fact_question_answers WHERE source_key = %s AND submission_id = ANY(%s)",
+        (source_key, list(facts_by_submission))
+    )
+    cursor.execute(f"""
+        INSERT INTO fact_question_answers ({ANSWER_COLUMNS})
+        SELECT {ANSWER_COLUMNS} FROM stg_question_answers
+        ON CONFLICT DO NOTHING
+    """)
+    cursor.execute("TRUNCATE stg_question_answers")
+    cursor.close()
+    print(f"   [OK] {copied} reponses chargees (COPY)")
+
+def copy_question_answers(conn, answer_batches, questions_dict, facts, source_key):
+    """Charger fact_question_answers par COPY (via une table temporaire), sans commit"""
+    facts_by_submission = {fact['submission_id']: fact for fact in facts}
+    copied = 0
+    for batch in answer_batches:
+        copied += copy_answer_batch(conn, batch, questions_dict, facts_by_submission, source_key)
+    merge_question_answers(conn, facts_by_submission, source_key, copied)
+    return copied
+
+def _load_slice(pool, facts, source_key, table):
+    """Charger une tranche de faits sur sa propre connexion, dans sa propre transaction"""
+    conn = pool.getconn()
+    try:
+        load_facts(conn, facts, source_key, commit=True, with_dates=False, table=table)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+    return len(facts)
+
+def load_facts_parallel(pool, facts, source_key, workers, table='fact_exam_results'):
+    """Répartir les faits sur plusieurs connexions du pool, chacune dans sa transaction"""
+    if not facts:
+        return 0
+    
+    # Les dates sont créées une seule fois avant le chargement parallèle (clés étrangères)
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor()
+        load_dim_dates(cursor, facts)
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+    
+    slice_size = -(-len(facts) // workers)
+    slices = [facts[i:i + slice_size] for i in range(0, len(facts), slice_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = sum(executor.map(lambda part: _load_slice(pool, part, source_key, table), slices))
+    return loaded
+
+def verify_facts_loaded(conn, facts, source_key, table='fact_exam_results'):
+    """Étape de cohérence : toutes les soumissions du chunk doivent être présentes"""
+    submission_ids = [fact['submission_id'] for fact in facts]
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE source_key = %s AND submission_id = ANY(%s)",
+        (source_key, submission_ids)
+    )
+    found = cursor.fetchone()[0]
+    cursor.close()
+    if found != len(submission_ids):
+        raise RuntimeError(
+            f"Chargement parallele incoherent : {found}/{len(submission_ids)} faits presents"
+        )
+
+# Tables de faits dont les index secondaires sont différés pendant un rechargement complet
+DEFERRED_INDEX_TABLES = ['fact_exam_results', 'fact_question_answers']
+
+def drop_secondary_indexes(conn, tables=DEFERRED_INDEX_TABLES):
+    """Supprimer les index secondaires (ni uniques ni primaires) des faits avant un rechargement complet
+
+    Les définitions sont gardées dans etl_deferred_indexes : un chargement qui échoue
+    les reconstruit à la fin de l'exécution terminée suivante.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO etl_deferred_indexes (index_name, table_name, definition)
+        SELECT c.relname, t.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public' AND t.relname = ANY(%s)
+          AND NOT i.indisunique AND NOT i.indisprimary
+        ON CONFLICT (index_name) DO NOTHING
+        RETURNING index_name
+    """, (list(tables),))
+    index_names = [row[0] for row in cursor.fetchall()]
+    for index_name in index_names:
+        cursor.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+    conn.commit()
+    cursor.close()
+    print(f"\n[INDEX] {len(index_names)} index secondaire(s) supprime(s) avant le rechargement complet")
+    return index_names
+
+def _rebuild_index(index_name, definition):
+    """Reconstruire un index différé sur sa propre connexion"""
+    conn = get_postgres_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(definition.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+        cursor.execute("DELETE FROM etl_deferred_indexes WHERE index_name = %s", (index_name,))
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return index_name
+
+def rebuild_secondary_indexes(conn, workers=ETL_INDEX_WORKERS):
+    """Reconstruire en parallèle les index différés (une connexion par index en cours)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT index_name, definition FROM etl_deferred_indexes ORDER BY index_name")
+    pending = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+    if not pending:
+        return []
+    
+    print(f"\n[INDEX] Reconstruction de {len(pending)} index ({min(workers, len(pending))} en parallele)...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+        rebuilt = list(executor.map(lambda item: _rebuild_index(*item), pending))
+    print(f"   [OK] Index reconstruits en {time.perf_counter() - start:.1f}s")
+    return rebuilt
+
+# ============================================
+# CHECKPOINTS (REPRISE DES EXECUTIONS)
+# ============================================
+
+def get_or_create_source(conn, source_name):
+    """Clé de la source (base MongoDB) dans dim_source, créée si besoin"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO dim_source (source_name) VALUES (%s)
+        ON CONFLICT (source_name) DO UPDATE SET source_name = EXCLUDED.source_name
+        RETURNING source_key
+    """, (source_name,))
+    source_key = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return source_key
+
+def ensure_etl_schema(conn):
+    """Appliquer les migrations du schéma en attente (scripts/dw/migrations)"""
+    return run_migrations(conn, legacy_source=MONGO_DB)
+
+def acquire_etl_lock(conn):
+    """Prendre le verrou consultatif ETL (niveau session, libéré à la fermeture de la connexion)"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (ETL_LOCK_KEY,))
+    acquired = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return acquired
+
+def get_incremental_since(conn, source_key):
+    """Borne basse du mode incrémental : watermark de la dernière exécution terminée de la source
+
+    Tous moteurs confondus : une exécution terminée a chargé toutes les soumissions
+    de la source jusqu'à son watermark.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT MAX(watermark) FROM etl_runs WHERE status = 'completed' AND source_key = %s",
+        (source_key,)
+    )
+    watermark = cursor.fetchone()[0]
+    cursor.close()
+    if watermark is None:
+        return None
+    return watermark - timedelta(minutes=ETL_INCREMENTAL_MARGIN)
+
+def start_or_resume_run(conn, source_key, resume=True, incremental=False, engine=ENGINE_CHUNKED):
+    """Reprendre la dernière exécution inachevée de la source et du moteur, ou en démarrer une nouvelle"""
+    cursor = conn.cursor()
+    if resume:
+        cursor.execute("""
+            SELECT run_id, last_submission_id, chunks_done, facts_loaded, since
+            FROM etl_runs
+            WHERE status IN ('running', 'failed', 'interrupted')
+              AND source_key = %s AND engine = %s
+            ORDER BY run_id DESC
+            LIMIT 1
+        """, (source_key, engine))
+        row = cursor.fetchone()
+        if row:
+            run_id, last_submission_id, chunks_done, facts_loaded, since = row
+            cursor.execute("""
+                UPDATE etl_runs
+                SET status = 'running', error_message = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE run_id = %s
+            """, (run_id,))
+            conn.commit()
+            cursor.close()
+            print(f"\n[CHECKPOINT] Reprise de l'execution #{run_id} "
+                  f"({chunks_done} chunks, {facts_loaded} faits deja charges)")
+            return {
+                'run_id': run_id,
+                'source_key': source_key,
+                'last_submission_id': last_submission_id,
+                'chunks_done': chunks_done,
+                'facts_loaded': facts_loaded,
+                'since': since,
+                'status': 'running'
+            }
+    else:
+        cursor.execute("""
+            UPDATE etl_runs SET status = 'abandoned'
+            WHERE status IN ('running', 'failed', 'interrupted')
+              AND source_key = %s AND engine = %s
+        """, (source_key, engine))
+    
+    # Watermark (UTC, comme les dates MongoDB) pris avant toute extraction
+    since = get_incremental_since(conn, source_key) if incremental else None
+    cursor.execute("""
+        INSERT INTO etl_runs (status, since, watermark, source_key, engine)
+        VALUES ('running', %s, %s, %s, %s)
+        RETURNING run_id
+    """, (since, datetime.utcnow(), source_key, engine))
+    run_id = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    mode = f"incrementale depuis {since}" if since else "complete"
+    print(f"\n[CHECKPOINT] Nouvelle execution #{run_id} ({mode}, source_key={source_key})")
+    return {
+        'run_id': run_id, 'source_key': source_key, 'last_submission_id': None,
+        'chunks_done': 0, 'facts_loaded': 0, 'since': since, 'status': 'running'
+    }
+
+def save_checkpoint(conn, run):
+    """Enregistrer la frontière du dernier chunk (dans la transaction du chunk)"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE etl_runs
+        SET last_submission_id = %s, chunks_done = %s, facts_loaded = %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE run_id = %s
+    """, (run['last_submission_id'], run['chunks_done'], run['facts_loaded'], run['run_id']))
+    cursor.close()
+
+def commit_chunk(conn, run, facts, last_submission_id, pool=None, workers=1,
+                 answer_batches=None, questions_dict=None):
+    """Charger les faits d'un chunk et valider son checkpoint dans la même transaction
+
+    Avec un pool et plusieurs workers, les faits sont validés tranche par tranche
+    sur des connexions séparées ; le checkpoint n'avance qu'après vérification
+    que tout le chunk est présent (un chunk rejoué est idempotent via submission_id).
+    """
+    load_chunk_facts(conn, run, facts, pool, workers)
+    if facts and answer_batches is not None:
+        copy_question_answers(conn, answer_batches, questions_dict, facts, run['source_key'])
+    save_chunk_checkpoint(conn, run, facts, last_submission_id)
+
+def load_chunk_facts(conn, run, facts, pool=None, workers=1):
+    """Charger les faits d'un chunk (sans commit en chargement séquentiel)"""
+    source_key = run['source_key']
+    if facts and pool is not None and workers > 1:
+        load_facts_parallel(pool, facts, source_key, workers)
+        verify_facts_loaded(conn, facts, source_key)
+    elif facts:
+        load_facts(conn, facts, source_key, commit=False)
+
+def save_chunk_checkpoint(conn, run, facts, last_submission_id):
+    """Avancer le checkpoint après le chunk et valider la transaction du chunk"""
+    run['last_submission_id'] = last_submission_id
+    run['chunks_done'] += 1
+    run['facts_loaded'] += len(facts)
+    save_checkpoint(conn, run)
+    conn.commit()
+    print(f"   [CHECKPOINT] Chunk {run['chunks_done']} valide "
+          f"(dernier _id : {run['last_submission_id']})")
+
+def finish_run(conn, run, status, error_message=None):
+    """Marquer l'exécution comme terminée ('completed'), échouée ('failed') ou interrompue ('interrupted')"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE etl_runs
+        SET status = %s, error_message = %s, updated_at = CURRENT_TIMESTAMP,
+            finished_at = CASE WHEN %s = 'completed' THEN CURRENT_TIMESTAMP END
+        WHERE run_id = %s
+    """, (status, error_message, status, run['run_id']))
+    run['status'] = status
+    if status == 'completed':
+        # Notifié au commit : les caches de lecture (analytics_api.py) sont invalidés
+        cursor.execute("SELECT pg_notify('etl_load_completed', %s)", (str(run['run_id']),))
+    conn.commit()
+    cursor.close()
+
 # ============================================
 # FONCTION PRINCIPALE ETL
 # ============================================
 
-def run_etl():
-    """Exécuter le processus ETL complet"""
+def prepare_dimensions(mongo_db, pg_conn, source_key, session=None, since=None):
+    """Extraire, transformer et charger les dimensions ; retourner les dictionnaires de jointure
+
+    since (incrémental) : seuls les examens, étudiants et filières modifiés depuis since sont
+    relus et chargés, plus les étudiants des soumissions du delta (filière du fait) ; les clés
+    des examens, filières et questions déjà chargés viennent du DW.
+    """
+    # EXTRACTION
+    exams_raw = extract_exams(mongo_db, session, since)
+    student_ids = submission_student_ids(mongo_db, since, session) if since else None
+    students_raw = extract_students(mongo_db, session, since, student_ids)
+    filieres_raw = extract_filieres(mongo_db, session, since)
+    
+    # TRANSFORMATION
+    exams_transformed = transform_exams(exams_raw)
+    students_transformed = transform_students(students_raw)
+    filieres_transformed = transform_filieres(filieres_raw)
+    
+    # CHARGEMENT DES DIMENSIONS
+    exams_dict, students_dict, filieres_dict = load_dimensions(
+        pg_conn, exams_transformed, students_transformed, filieres_transformed, source_key
+    )
+    
+    # Les soumissions nécessitent les clés des dimensions
+    # Créer un mapping des étudiants MongoDB pour récupérer les filières
+    students_mongo_dict = {str(s['_id']): s for s in students_raw}
+    students_dict_enhanced = {}
+    for student_id, student_data in students_dict.items():
+        students_dict_enhanced[student_id] = student_data
+        students_dict_enhanced[student_id]['_mongo_data'] = students_mongo_dict.get(student_id, {})
+    
+    # Questions (dépendent de dim_exam) : celles des examens relus
+    exam_ids = [exam['_id'] for exam in exams_raw] if since else None
+    questions_dict = load_dim_question(
+        pg_conn, transform_questions(extract_questions(mongo_db, session, exam_ids), exams_dict), source_key
+    )
+    
+    if since:
+        exams_dict, filieres_dict, questions_dict = load_dimension_keys(pg_conn, source_key)
+    
+    return exams_dict, students_dict_enhanced, filieres_dict, questions_dict
+
+def open_run(pg_conn, sources, resume=True, incremental=False, engine=ENGINE_CHUNKED,
+             defer_indexes=False):
+    """Début commun des moteurs ETL : verrou, migrations, index différés, une exécution par source
+
+    Retourne {base MongoDB: exécution}, ou None si une autre instance détient le verrou.
+    """
+    if not acquire_etl_lock(pg_conn):
+        print("\n[LOCK] Une autre instance ETL est en cours : execution ignoree")
+        return None
+    
+    ensure_etl_schema(pg_conn)
+    # Rechargement complet : définitions gardées dans etl_deferred_indexes, reconstruits par close_run
+    if defer_indexes and not incremental:
+        drop_secondary_indexes(pg_conn)
+    return {
+        name: start_or_resume_run(
+            pg_conn, get_or_create_source(pg_conn, name),
+            resume=resume, incremental=incremental, engine=engine
+        )
+        for name in sources
+    }
+
+def close_run(pg_conn, runs, parquet_dir=None):
+    """Fin commune d'un chargement réussi : index différés, distributions de scores,
+    exécutions terminées, puis export Parquet"""
+    # Index différés (ce rechargement ou un rechargement précédent interrompu)
+    rebuild_secondary_indexes(pg_conn)
+    
+    # Distributions de scores (delta des faits chargés)
+    from score_distributions import refresh_score_distributions
+    refresh_score_distributions(pg_conn)
+    
+    for run in runs:
+        if run['status'] != 'completed':
+            finish_run(pg_conn, run, 'completed')
+    
+    # Après la fin des exécutions : export_after_run ne lève pas, un export en échec
+    # ne les rouvre pas
+    if parquet_dir:
+        from export_parquet import export_after_run
+        export_after_run(pg_conn, parquet_dir)
+
+def abort_run(pg_conn, runs, error):
+    """Marquer en échec les exécutions non terminées (reprises par l'exécution suivante)"""
+    print(f"\n ERREUR LORS DU PROCESSUS ETL : {error}")
+    pg_conn.rollback()
+    for run in runs:
+        if run['status'] != 'completed':
+            finish_run(pg_conn, run, 'failed', str(error)[:1000])
+
+# Options communes des lignes de commande des moteurs (add_run_arguments)
+RUN_ARGUMENTS = {
+    'restart': (('--restart',), dict(
+        action='store_true', help="Ignorer les checkpoints et repartir de zéro")),
+    'chunk-size': (('--chunk-size',), dict(
+        type=int, default=ETL_CHUNK_SIZE, help="Nombre de soumissions par chunk validé")),
+    'load-workers': (('--load-workers',), dict(
+        type=int, default=ETL_LOAD_WORKERS,
+        help="Nombre de connexions PostgreSQL pour charger les faits en parallèle")),
+    'incremental': (('--incremental',), dict(
+        action='store_true',
+        help="Ne traiter que les soumissions modifiées depuis la dernière exécution terminée")),
+    'parquet-dir': (('--parquet-dir',), dict(
+        default=ETL_PARQUET_DIR,
+        help="Répertoire de l'instantané Parquet à mettre à jour après le chargement")),
+    'defer-indexes': (('--defer-indexes',), dict(
+        action='store_true', default=ETL_DEFER_INDEXES,
+        help="Rechargement complet : supprimer les index secondaires des faits puis les reconstruire en parallèle")),
+    'snapshot': (('--snapshot',), dict(
+        action='store_true', default=ETL_SNAPSHOT_READS,
+        help="Lire toutes les collections à la même heure de cluster (read concern snapshot)")),
+}
+
+def add_run_arguments(parser, *names):
+    """Ajouter au parser les options communes demandées (clés de RUN_ARGUMENTS)"""
+    for name in names:
+        flags, options = RUN_ARGUMENTS[name]
+        parser.add_argument(*flags, **options)
+
+def run_etl(resume=True, chunk_size=ETL_CHUNK_SIZE, load_workers=ETL_LOAD_WORKERS,
+            incremental=False, stop_event=None, parquet_dir=ETL_PARQUET_DIR,
+            defer_indexes=ETL_DEFER_INDEXES, snapshot=ETL_SNAPSHOT_READS):
+    """Exécuter le processus ETL, par chunks de soumissions validés un à un
+
+    incremental : ne traiter que les soumissions modifiées depuis la dernière exécution terminée
+    stop_event : threading.Event vérifié entre deux chunks pour un arrêt propre
+    parquet_dir : écrire aussi l'instantané Parquet (partitions modifiées seulement)
+    defer_indexes : exécution complète sans les index secondaires des faits, reconstruits à la fin
+    snapshot : lire toutes les collections à la même heure de cluster (read concern snapshot),
+               exécutions incrémentales seulement (voir SNAPSHOT_FULL_RUN)
+    Retourne l'exécution (dict) ou None si une autre instance détient le verrou.
+    """
+    if snapshot and not incremental:
+        raise ValueError(SNAPSHOT_FULL_RUN)
+    
     print("\n" + "="*50)
     print("[ETL] DEMARRAGE DU PROCESSUS ETL")
     print("="*50)
@@ -391,56 +1220,104 @@ def run_etl():
     mongo_db = get_mongo_connection()
     pg_conn = get_postgres_connection()
     
+    runs = open_run(pg_conn, [MONGO_DB], resume=resume, incremental=incremental,
+                    defer_indexes=defer_indexes)
+    if runs is None:
+        mongo_db.client.close()
+        pg_conn.close()
+        return None
+    run = runs[MONGO_DB]
+    pg_pool = get_postgres_pool(load_workers) if load_workers > 1 else None
+    session = None
+    
     try:
-        # EXTRACTION
-        exams_raw = extract_exams(mongo_db)
-        submissions_raw = extract_submissions(mongo_db)
-        students_raw = extract_students(mongo_db)
-        filieres_raw = extract_filieres(mongo_db)
-        
-        # TRANSFORMATION
-        exams_transformed = transform_exams(exams_raw)
-        students_transformed = transform_students(students_raw)
-        filieres_transformed = transform_filieres(filieres_raw)
-        
-        # CHARGEMENT DES DIMENSIONS
-        exams_dict, students_dict, filieres_dict = load_dimensions(
-            pg_conn, exams_transformed, students_transformed, filieres_transformed
+        start = time.perf_counter()
+        # Dimensions, soumissions et réponses lues à la même heure de cluster
+        if snapshot and run['since'] is None:
+            print("[WARN] Aucun watermark : execution complete, lecture snapshot desactivee")
+        elif snapshot:
+            session = start_snapshot_session(mongo_db)
+        exams_dict, students_dict, filieres_dict, questions_dict = prepare_dimensions(
+            mongo_db, pg_conn, run['source_key'], session, since=run['since']
         )
         
-        # Transformer les soumissions (nécessite les clés des dimensions)
-        # Créer un mapping des étudiants MongoDB pour récupérer les filières
-        students_mongo_dict = {str(s['_id']): s for s in students_raw}
-        students_dict_enhanced = {}
-        for student_id, student_data in students_dict.items():
-            students_dict_enhanced[student_id] = student_data
-            students_dict_enhanced[student_id]['_mongo_data'] = students_mongo_dict.get(student_id, {})
+        # SOUMISSIONS PAR CHUNKS : faits + checkpoint validés dans la même transaction
+        print(f"\n[ETL] Traitement des soumissions par chunks de {chunk_size}...")
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                finish_run(pg_conn, run, 'interrupted')
+                print(f"\n[STOP] Arret demande : execution interrompue apres le chunk {run['chunks_done']}")
+                return run
+            
+            after_id = run['last_submission_id']
+            submissions_raw = extract_submissions_chunk(mongo_db, after_id, chunk_size, run['since'], session)
+            if not submissions_raw:
+                break
+            last_id = str(submissions_raw[-1]['_id'])
+            
+            facts = transform_submissions(
+                submissions_raw, exams_dict, students_dict, filieres_dict
+            )
+            
+            # CHARGEMENT DES FAITS
+            commit_chunk(
+                pg_conn, run, facts, last_id,
+                pool=pg_pool, workers=load_workers,
+                answer_batches=extract_question_answers(
+                    mongo_db, after_id, last_id, since=run['since'], session=session
+                ),
+                questions_dict=questions_dict
+            )
         
-        facts = transform_submissions(
-            submissions_raw, exams_dict, students_dict_enhanced, filieres_dict
-        )
+        # COURS, TP ET ENSEIGNANTS (mappings déclaratifs)
+        from etl_mappings import load_mapped_subjects
+        load_mapped_subjects(mongo_db, pg_conn, run['source_key'], run['since'], session=session)
         
-        # CHARGEMENT DES FAITS
-        if facts:
-            load_facts(pg_conn, facts)
+        close_run(pg_conn, [run], parquet_dir)
+        elapsed = time.perf_counter() - start
         
+    except Exception as e:
+        abort_run(pg_conn, [run], e)
+        print(f" [CHECKPOINT] Reprise possible apres le chunk {run['chunks_done']}")
+        raise
+    else:
         print("\n" + "="*50)
         print(" PROCESSUS ETL TERMINÉ AVEC SUCCÈS")
+        print(f" {run['facts_loaded']} faits charges en {run['chunks_done']} chunks")
+        print(f" Duree : {elapsed:.1f}s ({load_workers} connexion(s) de chargement)")
         print("="*50)
-        
-    except Exception as e:
-        print(f"\n ERREUR LORS DU PROCESSUS ETL : {e}")
-        pg_conn.rollback()
-        raise
+        return run
     finally:
+        if session is not None:
+            session.end_session()
         mongo_db.client.close()
         pg_conn.close()
+        if pg_pool is not None:
+            pg_pool.closeall()
         print("\n[CLOSE] Connexions fermees")
 
 # ============================================
 # EXECUTION
 # ============================================
 
+def parse_args():
+    """Lire les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="ETL MongoDB -> Data Warehouse PostgreSQL")
+    add_run_arguments(
+        parser, 'restart', 'chunk-size', 'load-workers', 'incremental',
+        'parquet-dir', 'defer-indexes', 'snapshot'
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    run_etl()
+    args = parse_args()
+    if args.snapshot and not args.incremental:
+        print(f"[ERREUR] {SNAPSHOT_FULL_RUN}")
+        sys.exit(2)
+    run_etl(
+        resume=not args.restart, chunk_size=args.chunk_size,
+        load_workers=args.load_workers, incremental=args.incremental,
+        parquet_dir=args.parquet_dir, defer_indexes=args.defer_indexes,
+        snapshot=args.snapshot
+    )
 
@@ -0,0 +1,404 @@
+"""
+ETL multi-sources : plusieurs bases MongoDB (une par campus) chargées dans un seul Data Warehouse.
+
+- Chaque base est extraite et transformée dans son propre processus ; le résultat
+  (clés naturelles MongoDB) est écrit en CSV dans un répertoire de travail.
+- Le processus principal charge chaque source dès qu'elle est prête : COPY dans des
+  tables temporaires puis INSERT ... SELECT ensemblistes, les clés de substitution
+  étant résolues par jointure sur (source_key, clé naturelle).
+- Chaque ligne de dimension et de fait porte la source_key de sa base (dim_source),
+  donc les exam_id / student_id de deux campus ne peuvent pas entrer en collision.
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from etl_mongodb_to_dw import (
+    MONGO_DB,
+    ETL_PARQUET_DIR,
+    ETL_DEFER_INDEXES,
+    ETL_SNAPSHOT_READS,
+    ENGINE_MULTI_SOURCE,
+    get_postgres_connection,
+    get_mongo_client,
+    start_snapshot_session,
+    extract_exams,
+    extract_students,
+    extract_filieres,
+    extract_questions,
+    extract_question_answers,
+    transform_exams,
+    transform_students,
+    transform_filieres,
+    student_filiere_id,
+    submission_measures,
+    fact_upsert_clause,
+    dim_date_insert,
+    open_run,
+    close_run,
+    abort_run,
+    add_run_arguments,
+    save_checkpoint,
+    finish_run,
+)
+from etl_mappings import load_mapped_subjects
+
+# Bases MongoDB sources, séparées par des virgules (défaut : MONGO_DB seule)
+MONGO_DBS = [name.strip() for name in os.getenv('MONGO_DBS', MONGO_DB).split(',') if name.strip()]
+
+# Marqueur NULL des fichiers CSV (distingue NULL de la chaîne vide)
+CSV_NULL = '\\N'
+
+# Colonnes des fichiers intermédiaires et des tables temporaires (même ordre)
+STAGING_TABLES = {
+    'exams': """
+        exam_id VARCHAR(50), title VARCHAR(255), description TEXT,
+        total_points DECIMAL(10,2), min_passing_score DECIMAL(5,2), duration INTEGER,
+        is_published BOOLEAN, published_date TIMESTAMP, created_date TIMESTAMP,
+        updated_date TIMESTAMP
+    """,
+    'students': """
+        student_id VARCHAR(50), username VARCHAR(100), email VARCHAR(255),
+        first_name VARCHAR(100), last_name VARCHAR(100), full_name VARCHAR(200),
+        enrollment_date TIMESTAMP, student_number VARCHAR(50)
+    """,
+    'filieres': """
+        filiere_id VARCHAR(50), name VARCHAR(255), code VARCHAR(50),
+        description TEXT, duration INTEGER
+    """,
+    'questions': """
+        question_id VARCHAR(50), exam_id VARCHAR(50), position INTEGER,
+        question_text TEXT, question_type VARCHAR(20), points DECIMAL(10,2)
+    """,
+    'facts': """
+        submission_id VARCHAR(50), exam_id VARCHAR(50), student_id VARCHAR(50),
+        filiere_id VARCHAR(50), date_key INTEGER, score DECIMAL(10,2),
+        total_points DECIMAL(10,2), percentage DECIMAL(5,2), passed BOOLEAN,
+        time_taken_minutes INTEGER, certificate_generated BOOLEAN,
+        created_at TIMESTAMP, submitted_at TIMESTAMP
+    """,
+    'answers': """
+        submission_id VARCHAR(50), question_id VARCHAR(50), answer_text TEXT,
+        points_earned DECIMAL(10,2)
+    """,
+}
+
+def staging_columns(name):
+    """Noms des colonnes d'une table temporaire"""
+    return [column.split()[0] for column in re.split(r',(?![^(]*\))', STAGING_TABLES[name])]
+
+# ============================================
+# EXTRACTION + TRANSFORMATION (PROCESSUS PAR SOURCE)
+# ============================================
+
+def write_csv(path, rows, columns):
+    """Écrire des lignes (dictionnaires) en CSV ; retourne le nombre de lignes"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for row in rows:
+            writer.writerow([CSV_NULL if row.get(c) is None else row.get(c) for c in columns])
+            count += 1
+    return count
+
+def extract_transform_source(source_name, since, work_dir, snapshot=False):
+    """Extraire et transformer une base source ; retourne les fichiers CSV produits
+
+    snapshot : toutes les collections de la source lues à la même heure de cluster
+    """
+    client = get_mongo_client()
+    db = client[source_name]
+    session = start_snapshot_session(db) if snapshot else None
+    source_dir = os.path.join(work_dir, source_name)
+    os.makedirs(source_dir, exist_ok=True)
+    files = {name: os.path.join(source_dir, f"{name}.csv") for name in STAGING_TABLES}
+    counts = {}
+
+    try:
+        counts['exams'] = write_csv(files['exams'], transform_exams(extract_exams(db, session)), staging_columns('exams'))
+        students_raw = extract_students(db, session)
+        counts['students'] = write_csv(files['students'], transform_students(students_raw), staging_columns('students'))
+        counts['filieres'] = write_csv(files['filieres'], transform_filieres(extract_filieres(db, session)), staging_columns('filieres'))
+
+        questions = (
+            {
+                'question_id': str(row['question']['_id']),
+                'exam_id': str(row['exam_id']),
+                'position': int(row.get('position', 0)) + 1,
+                'question_text': row['question'].get('question', '').strip(),
+                'question_type': row['question'].get('type', 'multiple_choice'),
+                'points': float(row['question'].get('points', 1) or 0)
+            }
+            for row in extract_questions(db, session) if row.get('question', {}).get('_id')
+        )
+        counts['questions'] = write_csv(files['questions'], questions, staging_columns('questions'))
+
+        # Soumissions lues en flux ; la filière vient de la fiche étudiant
+        filiere_by_student = {str(s['_id']): student_filiere_id(s) for s in students_raw}
+        query = {'isSubmitted': True}
+        if since:
+            query['updatedAt'] = {'$gte': since}
+
+        def facts():
+            for sub in db.examsubmissions.find(query, {'answers': 0}, session=session):
+                fact = submission_measures(sub)
+                student_id = str(sub.get('student'))
+                fact.update({
+                    'exam_id': str(sub.get('exam')),
+                    'student_id': student_id,
+                    'filiere_id': filiere_by_student.get(student_id)
+                })
+                yield fact
+
+        counts['facts'] = write_csv(files['facts'], facts(), staging_columns('facts'))
+
+        def answers():
+            for batch in extract_question_answers(db, since=since, session=session):
+                for ans in batch:
+                    answer = ans.get('answer')
+                    if answer is not None and not isinstance(answer, str):
+                        answer = json.dumps(answer, default=str, ensure_ascii=False)
+                    yield {
+                        'submission_id': str(ans['submission_id']),
+                        'question_id': str(ans.get('question_id')),
+                        'answer_text': answer,
+                        'points_earned': float(ans.get('points', 0) or 0)
+                    }
+
+        counts['answers'] = write_csv(files['answers'], answers(), staging_columns('answers'))
+    finally:
+        if session is not None:
+            session.end_session()
+        client.close()
+
+    print(f"\n[SOURCE] {source_name} : {counts}")
+    return files
+
+# ============================================
+# CHARGEMENT EN MASSE (PROCESSUS PRINCIPAL)
+# ============================================
+
+LOAD_STATEMENTS = [
+    ('dim_exam', """
+        INSERT INTO dim_exam (
+            source_key, exam_id, title, description, total_points, min_passing_score,
+            duration, is_published, published_date, created_date, updated_date
+        )
+        SELECT %(source_key)s, exam_id, title, description, total_points, min_passing_score,
+               duration, is_published, published_date, created_date, updated_date
+        FROM stg_exams
+        ON CONFLICT (source_key, exam_id) DO UPDATE SET
+            title = EXCLUDED.title,
+            description = EXCLUDED.description,
+            total_points = EXCLUDED.total_points,
+            min_passing_score = EXCLUDED.min_passing_score,
+            duration = EXCLUDED.duration,
+            is_published = EXCLUDED.is_published,
+            published_date = EXCLUDED.published_date,
+            updated_date = EXCLUDED.updated_date
+    """),
+    ('dim_student', """
+        INSERT INTO dim_student (
+            source_key, student_id, username, email, first_name, last_name,
+            full_name, enrollment_date, student_number
+        )
+        SELECT %(source_key)s, student_id, username, email, first_name, last_name,
+               full_name, enrollment_date, student_number
+        FROM stg_students
+        ON CONFLICT (source_key, student_id) DO UPDATE SET
+            username = EXCLUDED.username,
+            email = EXCLUDED.email,
+            first_name = EXCLUDED.first_name,
+            last_name = EXCLUDED.last_name,
+            full_name = EXCLUDED.full_name,
+            enrollment_date = EXCLUDED.enrollment_date,
+            student_number = EXCLUDED.student_number
+    """),
+    ('dim_filiere', """
+        INSERT INTO dim_filiere (source_key, filiere_id, name, code, description, duration)
+        SELECT %(source_key)s, filiere_id, name, code, description, duration
+        FROM stg_filieres
+        ON CONFLICT (source_key, filiere_id) DO UPDATE SET
+            name = EXCLUDED.name,
+            code = EXCLUDED.code,
+            description = EXCLUDED.description,
+            duration = EXCLUDED.duration
+    """),
+    ('dim_question', """
+        INSERT INTO dim_question (
+            source_key, question_id, exam_key, position, question_text, question_type, points
+        )
+        SELECT %(source_key)s, q.question_id, e.exam_key, q.position,
+               q.question_text, q.question_type, q.points
+        FROM stg_questions q
+        JOIN dim_exam e ON e.source_key = %(source_key)s AND e.exam_id = q.exam_id
+        ON CONFLICT (source_key, question_id) DO UPDATE SET
+            exam_key = EXCLUDED.exam_key,
+            position = EXCLUDED.position,
+            question_text = EXCLUDED.question_text,
+            question_type = EXCLUDED.question_type,
+            points = EXCLUDED.points
+    """),
+    ('dim_date', dim_date_insert('stg_facts')),
+    # Les soumissions sans examen, étudiant ou filière connus sont écartées par les jointures
+    ('fact_exam_results', """
+        INSERT INTO fact_exam_results (
+            source_key, submission_id, exam_key, student_key, filiere_key, date_key,
+            score, total_points, percentage, passed,
+            duration_minutes, time_taken_minutes, certificate_generated,
+            created_at, submitted_at
+        )
+        SELECT %(source_key)s, s.submission_id, e.exam_key, st.student_key, fil.filiere_key, s.date_key,
+               s.score, s.total_points, s.percentage, s.passed,
+               e.duration, s.time_taken_minutes, s.certificate_generated,
+               s.created_at, s.submitted_at
+        FROM stg_facts s
+        JOIN dim_exam e ON e.source_key = %(source_key)s AND e.exam_id = s.exam_id
+        JOIN dim_student st ON st.source_key = %(source_key)s AND st.student_id = s.student_id
+        JOIN dim_filiere fil ON fil.source_key = %(source_key)s AND fil.filiere_id = s.filiere_id
+    """ + fact_upsert_clause()),
+    # Réponses des soumissions extraites remplacées (une nouvelle tentative réécrit answers[])
+    ('replaced_answers', """
+        DELETE FROM fact_question_answers a
+        USING stg_facts s
+        WHERE a.source_key = %(source_key)s AND a.submission_id = s.submission_id
+    """),
+    ('fact_question_answers', """
+        INSERT INTO fact_question_answers (
+            source_key, submission_id, question_key, exam_key, student_key, date_key,
+            answer_text, points_earned, points_possible, is_correct
+        )
+        SELECT %(source_key)s, a.submission_id, q.question_key, f.exam_key, f.student_key, f.date_key,
+               a.answer_text, a.points_earned, q.points,
+               q.points > 0 AND a.points_earned >= q.points
+        FROM stg_answers a
+        JOIN dim_question q ON q.source_key = %(source_key)s AND q.question_id = a.question_id
+        JOIN fact_exam_results f ON f.source_key = %(source_key)s AND f.submission_id = a.submission_id
+        ON CONFLICT DO NOTHING
+    """),
+]
+
+def load_source_bulk(conn, source_key, files):
+    """Charger une source : COPY dans les tables temporaires puis INSERT ... SELECT, une transaction"""
+    cursor = conn.cursor()
+    for name, definition in STAGING_TABLES.items():
+        cursor.execute(f"CREATE TEMP TABLE stg_{name} ({definition}) ON COMMIT DROP")
+        with open(files[name], 'r', encoding='utf-8') as f:
+            cursor.copy_expert(
+                f"COPY stg_{name} ({', '.join(staging_columns(name))}) "
+                f"FROM STDIN WITH (FORMAT csv, NULL '{CSV_NULL}')",
+                f
+            )
+
+    loaded = {}
+    for table, statement in LOAD_STATEMENTS:
+        cursor.execute(statement, {'source_key': source_key})
+        loaded[table] = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return loaded
+
+def load_source_mappings(mongo_client, pg_conn, source_name, source_key, since, snapshot=False):
+    """Exécuter les mappings déclaratifs (cours, TP, enseignants) d'une source"""
+    db = mongo_client[source_name]
+    session = start_snapshot_session(db) if snapshot else None
+    try:
+        return load_mapped_subjects(db, pg_conn, source_key, since, session=session)
+    finally:
+        if session is not None:
+            session.end_session()
+
+# ============================================
+# FONCTION PRINCIPALE ETL MULTI-SOURCES
+# ============================================
+
+def run_multi_source_etl(sources=MONGO_DBS, workers=None, incremental=False, parquet_dir=ETL_PARQUET_DIR,
+                         defer_indexes=ETL_DEFER_INDEXES, snapshot=ETL_SNAPSHOT_READS):
+    """Extraire / transformer les sources en parallèle et les charger dans le DW commun"""
+    print("\n" + "="*50)
+    print(f"[ETL-MULTI] DEMARRAGE ({len(sources)} sources : {', '.join(sources)})")
+    print("="*50)
+
+    pg_conn = get_postgres_connection()
+    # Une exécution par source, avec son propre watermark incrémental. Pas de reprise par
+    # chunk ici : chaque source est validée d'un bloc (rechargement idempotent)
+    runs = open_run(pg_conn, sources, resume=False, incremental=incremental,
+                    engine=ENGINE_MULTI_SOURCE, defer_indexes=defer_indexes)
+    if runs is None:
+        pg_conn.close()
+        return None
+    source_keys = {name: run['source_key'] for name, run in runs.items()}
+    work_dir = tempfile.mkdtemp(prefix='etl_multi_')
+    # Cours, TP et enseignants : mappings déclaratifs exécutés depuis le processus principal
+    mongo_client = get_mongo_client()
+
+    try:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers or len(sources)) as executor:
+            futures = {
+                executor.submit(extract_transform_source, name, runs[name]['since'], work_dir, snapshot): name
+                for name in sources
+            }
+            # Chaque source est chargée dès que son processus a terminé, et son exécution
+            # terminée aussitôt : l'échec d'une autre source ne la fait pas recharger
+            for future in as_completed(futures):
+                name = futures[future]
+                run = runs[name]
+                loaded = load_source_bulk(pg_conn, source_keys[name], future.result())
+                loaded.update(load_source_mappings(
+                    mongo_client, pg_conn, name, source_keys[name], run['since'], snapshot
+                ))
+                run['chunks_done'] = 1
+                run['facts_loaded'] = loaded['fact_exam_results']
+                save_checkpoint(pg_conn, run)
+                finish_run(pg_conn, run, 'completed')
+                print(f"   [OK] Source {name} (source_key={source_keys[name]}) chargee : {loaded}")
+
+        close_run(pg_conn, list(runs.values()), parquet_dir)
+        elapsed = time.perf_counter() - start
+
+    except Exception as e:
+        # Les sources déjà chargées restent terminées
+        abort_run(pg_conn, list(runs.values()), e)
+        raise
+    else:
+        print("\n" + "="*50)
+        print(" PROCESSUS ETL MULTI-SOURCES TERMINÉ AVEC SUCCÈS")
+        facts_loaded = sum(run['facts_loaded'] for run in runs.values())
+        print(f" {facts_loaded} faits charges depuis {len(runs)} sources en {elapsed:.1f}s")
+        print("="*50)
+        return runs
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        mongo_client.close()
+        pg_conn.close()
+        print("\n[CLOSE] Connexions fermees")
+
+# ============================================
+# EXECUTION
+# ============================================
+
+def parse_args():
+    """Lire les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="ETL multi-sources MongoDB -> Data Warehouse")
+    parser.add_argument('--sources', nargs='+', default=MONGO_DBS,
+                        help="Bases MongoDB à charger (défaut : MONGO_DBS)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Nombre de processus d'extraction (défaut : un par source)")
+    add_run_arguments(parser, 'incremental', 'parquet-dir', 'defer-indexes', 'snapshot')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_multi_source_etl(
+        sources=args.sources, workers=args.workers,
+        incremental=args.incremental, parquet_dir=args.parquet_dir,
+        defer_indexes=args.defer_indexes, snapshot=args.snapshot
+    )
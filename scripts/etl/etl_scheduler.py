@@ -0,0 +1,130 @@
+"""
+Mode démon de l'ETL : cycles incrémentaux à intervalle régulier (micro-batchs).
+
+- Le verrou consultatif PostgreSQL de run_etl garantit qu'une seule instance charge à la fois
+  (un cycle qui ne l'obtient pas est simplement ignoré).
+- Chaque cycle s'exécute, même sans nouvelle soumission (dimensions et cours / TP modifiés,
+  reprise, index différés) ; la taille des chunks s'adapte au backlog observé avant le cycle.
+- SIGINT / SIGTERM arrêtent le démon proprement entre deux chunks ;
+  l'exécution interrompue est reprise au démarrage suivant.
+"""
+
+import argparse
+import signal
+import threading
+import os
+
+from etl_mongodb_to_dw import (
+    ETL_LOAD_WORKERS,
+    ETL_SNAPSHOT_READS,
+    get_mongo_connection,
+    get_postgres_connection,
+    MONGO_DB,
+    ensure_etl_schema,
+    get_or_create_source,
+    get_incremental_since,
+    run_etl,
+    add_run_arguments,
+)
+
+# Intervalle entre deux cycles (secondes)
+ETL_INTERVAL = int(os.getenv('ETL_INTERVAL', '300'))
+
+# Bornes de la taille des chunks, et nombre de chunks visé par cycle
+ETL_MIN_CHUNK_SIZE = int(os.getenv('ETL_MIN_CHUNK_SIZE', '500'))
+ETL_MAX_CHUNK_SIZE = int(os.getenv('ETL_MAX_CHUNK_SIZE', '20000'))
+ETL_TARGET_CHUNKS = int(os.getenv('ETL_TARGET_CHUNKS', '10'))
+
+# ============================================
+# BACKLOG ET TAILLE DES CHUNKS
+# ============================================
+
+def measure_backlog():
+    """Compter les soumissions à traiter depuis la dernière exécution terminée"""
+    mongo_db = get_mongo_connection()
+    pg_conn = get_postgres_connection()
+    try:
+        ensure_etl_schema(pg_conn)
+        since = get_incremental_since(pg_conn, get_or_create_source(pg_conn, MONGO_DB))
+        query = {'isSubmitted': True}
+        if since:
+            query['updatedAt'] = {'$gte': since}
+        return mongo_db.examsubmissions.count_documents(query)
+    finally:
+        mongo_db.client.close()
+        pg_conn.close()
+
+def adaptive_chunk_size(backlog, min_chunk=ETL_MIN_CHUNK_SIZE, max_chunk=ETL_MAX_CHUNK_SIZE,
+                        target_chunks=ETL_TARGET_CHUNKS):
+    """Petits chunks quand le backlog est faible (latence), gros chunks quand il grossit (débit)"""
+    chunk_size = -(-backlog // target_chunks)
+    return max(min_chunk, min(max_chunk, chunk_size))
+
+# ============================================
+# BOUCLE DU DEMON
+# ============================================
+
+def run_daemon(interval=ETL_INTERVAL, min_chunk=ETL_MIN_CHUNK_SIZE, max_chunk=ETL_MAX_CHUNK_SIZE,
+               load_workers=ETL_LOAD_WORKERS, once=False, snapshot=ETL_SNAPSHOT_READS):
+    """Enchaîner les cycles incrémentaux jusqu'à SIGINT / SIGTERM"""
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\n[STOP] Signal {signum} recu : arret apres le chunk en cours")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    print("="*60)
+    print(f"[DAEMON] ETL en mode demon (intervalle : {interval}s)")
+    print("="*60)
+
+    cycle = 0
+    while not stop_event.is_set():
+        cycle += 1
+        try:
+            backlog = measure_backlog()
+            chunk_size = adaptive_chunk_size(backlog, min_chunk, max_chunk)
+            print(f"\n[DAEMON] Cycle {cycle} : backlog {backlog} soumissions, chunks de {chunk_size}")
+
+            # Cycle lancé même sans soumission : dimensions, cours / TP, reprise d'une
+            # exécution inachevée et index différés (un delta vide est rapide)
+            run_etl(
+                resume=True, chunk_size=chunk_size, load_workers=load_workers,
+                incremental=True, stop_event=stop_event, snapshot=snapshot
+            )
+        except Exception as e:
+            # L'exécution est marquée 'failed' et sera reprise au cycle suivant
+            print(f"\n[DAEMON] Erreur pendant le cycle {cycle} : {e}")
+
+        if once:
+            break
+        stop_event.wait(interval)
+
+    print("\n[DAEMON] Arret du demon")
+
+# ============================================
+# EXECUTION
+# ============================================
+
+def parse_args():
+    """Lire les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="ETL MongoDB -> Data Warehouse (mode démon)")
+    parser.add_argument('--interval', type=int, default=ETL_INTERVAL,
+                        help="Secondes entre deux cycles incrémentaux")
+    parser.add_argument('--min-chunk', type=int, default=ETL_MIN_CHUNK_SIZE,
+                        help="Taille minimale des chunks")
+    parser.add_argument('--max-chunk', type=int, default=ETL_MAX_CHUNK_SIZE,
+                        help="Taille maximale des chunks")
+    parser.add_argument('--once', action='store_true',
+                        help="Exécuter un seul cycle puis quitter (utilisable depuis cron)")
+    add_run_arguments(parser, 'load-workers', 'snapshot')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_daemon(
+        interval=args.interval, min_chunk=args.min_chunk, max_chunk=args.max_chunk,
+        load_workers=args.load_workers, once=args.once, snapshot=args.snapshot
+    )
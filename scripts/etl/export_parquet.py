@@ -0,0 +1,247 @@
+"""
+Export d'un instantané Parquet (colonnaire) du schéma en étoile, pour DuckDB / pandas / Power BI.
+
+- fact_exam_results est partitionnée par année / mois de date_key
+  (fact_exam_results/year=2024/month=5/part-0.parquet), avec les attributs
+  des dimensions (examen, filière) encodés en dictionnaire ;
+- les dimensions sont écrites en un fichier chacune ;
+- l'export est incrémental : seules les partitions modifiées depuis le dernier export
+  sont réécrites, c'est-à-dire celles qui contiennent des faits chargés ou mis à jour
+  (load_timestamp), dont le nombre de faits a changé (fait déplacé vers un autre mois),
+  ou qui référencent un examen ou une filière renommés ; une partition vidée est supprimée.
+
+Dépendance optionnelle : pyarrow.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+MANIFEST_FILE = '_snapshot.json'
+
+# Dimensions exportées et colonnes texte encodées en dictionnaire
+DIMENSIONS = {
+    'dim_source': ['source_name'],
+    'dim_exam': ['title'],
+    'dim_student': [],
+    'dim_filiere': ['name', 'code'],
+    'dim_date': ['month_name', 'day_name'],
+    'dim_question': ['question_type'],
+    'dim_teacher': [],
+}
+
+# Faits : attributs des dimensions dénormalisés (faible cardinalité -> dictionnaire)
+FACT_QUERY = """
+    SELECT
+        f.fact_id, f.source_key, f.submission_id,
+        f.exam_key, f.student_key, f.filiere_key, f.date_key,
+        e.title AS exam_title,
+        fil.name AS filiere_name,
+        fil.code AS filiere_code,
+        f.score::FLOAT8 AS score,
+        f.total_points::FLOAT8 AS total_points,
+        f.percentage::FLOAT8 AS percentage,
+        f.passed,
+        f.duration_minutes, f.time_taken_minutes, f.certificate_generated,
+        f.created_at, f.submitted_at, f.load_timestamp
+    FROM fact_exam_results f
+    JOIN dim_exam e ON e.exam_key = f.exam_key
+    JOIN dim_filiere fil ON fil.filiere_key = f.filiere_key
+    WHERE f.date_key BETWEEN %s AND %s
+    ORDER BY f.date_key, f.fact_id
+"""
+FACT_DICTIONARY_COLUMNS = ['exam_title', 'filiere_name', 'filiere_code']
+
+# ============================================
+# UTILITAIRES
+# ============================================
+
+def read_manifest(output_dir):
+    """Lire le manifeste du dernier export (vide si aucun)"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(output_dir, manifest):
+    """Écrire le manifeste de manière atomique"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def query_dataframe(cursor, sql, params=None):
+    """Exécuter une requête et retourner un DataFrame"""
+    cursor.execute(sql, params)
+    columns = [desc[0] for desc in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def write_parquet(df, path, dictionary_columns):
+    """Écrire un DataFrame en Parquet (fichier temporaire puis renommage atomique)"""
+    for column in dictionary_columns:
+        df[column] = df[column].astype('category')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, path + '.tmp', compression='snappy', use_dictionary=True)
+    os.replace(path + '.tmp', path)
+
+# ============================================
+# EXPORT
+# ============================================
+
+def export_dimensions(cursor, output_dir):
+    """Réécrire les dimensions (petites tables, un fichier chacune)"""
+    for table, dictionary_columns in DIMENSIONS.items():
+        df = query_dataframe(cursor, f"SELECT * FROM {table}")
+        write_parquet(df, os.path.join(output_dir, f"{table}.parquet"), dictionary_columns)
+
+def partition_path(output_dir, year, month):
+    """Fichier de la partition année / mois de fact_exam_results"""
+    return os.path.join(
+        output_dir, 'fact_exam_results', f"year={year}", f"month={month}", 'part-0.parquet'
+    )
+
+def export_fact_partition(cursor, output_dir, year, month):
+    """Réécrire la partition année / mois de fact_exam_results"""
+    first_key = year * 10000 + month * 100 + 1
+    last_key = year * 10000 + month * 100 + 31
+    df = query_dataframe(cursor, FACT_QUERY, (first_key, last_key))
+    write_parquet(df, partition_path(output_dir, year, month), FACT_DICTIONARY_COLUMNS)
+    return len(df)
+
+def remove_fact_partition(output_dir, year, month):
+    """Supprimer une partition qui ne contient plus aucun fait"""
+    path = partition_path(output_dir, year, month)
+    if os.path.exists(path):
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+def partition_name(year, month):
+    """Nom d'une partition dans le manifeste (AAAA-MM)"""
+    return f"{year}-{month:02d}"
+
+def dimension_labels(cursor):
+    """Attributs des dimensions copiés dans les faits, par clé (comparés d'un export à l'autre)"""
+    cursor.execute("SELECT exam_key, title FROM dim_exam")
+    exams = {str(key): title for key, title in cursor.fetchall()}
+    cursor.execute("SELECT filiere_key, name, code FROM dim_filiere")
+    filieres = {str(key): [name, code] for key, name, code in cursor.fetchall()}
+    return {'exam': exams, 'filiere': filieres}
+
+def changed_keys(previous, current):
+    """Clés dont les attributs ont changé depuis le dernier export"""
+    return [int(key) for key, value in current.items() if key in previous and previous[key] != value]
+
+def export_parquet_snapshot(pg_conn, output_dir, full=False):
+    """Exporter l'instantané ; seules les partitions modifiées depuis le dernier export sont réécrites"""
+    if pa is None:
+        raise ImportError("pyarrow est requis pour l'export Parquet (pip install pyarrow)")
+
+    print(f"\n[PARQUET] Export de l'instantane vers {output_dir}...")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {} if full else read_manifest(output_dir)
+    since = manifest.get('last_load_timestamp')
+    previous_counts = manifest.get('partition_rows', {})
+    previous_labels = manifest.get('dimension_labels', {})
+
+    cursor = pg_conn.cursor()
+    # Borne haute prise avant de lister les partitions : rien n'est manqué au prochain export
+    cursor.execute("SELECT MAX(load_timestamp) FROM fact_exam_results")
+    high_watermark = cursor.fetchone()[0]
+
+    # Nombre de faits par mois (index idx_fact_month) : partitions nouvelles, vidées ou modifiées
+    cursor.execute("SELECT date_key / 100, COUNT(*) FROM fact_exam_results GROUP BY date_key / 100")
+    counts = {(month_key // 100, month_key % 100): count for month_key, count in cursor.fetchall()}
+    partitions = {
+        partition for partition, count in counts.items()
+        if previous_counts.get(partition_name(*partition)) != count
+    }
+
+    # Faits chargés ou mis à jour depuis le dernier export
+    if since:
+        cursor.execute("""
+            SELECT DISTINCT date_key / 10000, (date_key / 100) % 100
+            FROM fact_exam_results
+            WHERE load_timestamp > %s
+        """, (since,))
+        partitions.update(cursor.fetchall())
+
+    # Examens ou filières renommés : leurs attributs sont copiés dans les faits
+    labels = dimension_labels(cursor)
+    renamed_exams = changed_keys(previous_labels.get('exam', {}), labels['exam'])
+    renamed_filieres = changed_keys(previous_labels.get('filiere', {}), labels['filiere'])
+    if renamed_exams or renamed_filieres:
+        cursor.execute("""
+            SELECT DISTINCT date_key / 10000, (date_key / 100) % 100
+            FROM fact_exam_results
+            WHERE exam_key = ANY(%s) OR filiere_key = ANY(%s)
+        """, (renamed_exams, renamed_filieres))
+        partitions.update(cursor.fetchall())
+
+    partitions = sorted(partitions)
+    rows = 0
+    for year, month in partitions:
+        rows += export_fact_partition(cursor, output_dir, year, month)
+    previous_partitions = {tuple(int(part) for part in name.split('-')) for name in previous_counts}
+    emptied = sorted(previous_partitions - set(counts))
+    for year, month in emptied:
+        remove_fact_partition(output_dir, year, month)
+    export_dimensions(cursor, output_dir)
+    pg_conn.commit()
+    cursor.close()
+
+    write_manifest(output_dir, {
+        'last_load_timestamp': high_watermark.isoformat() if high_watermark else since,
+        'exported_at': datetime.now().isoformat(),
+        'partition_rows': {partition_name(*partition): count for partition, count in counts.items()},
+        'dimension_labels': labels,
+        'partitions_rewritten': [partition_name(year, month) for year, month in partitions],
+        'partitions_removed': [partition_name(year, month) for year, month in emptied]
+    })
+    print(f"   [OK] {len(partitions)} partition(s) reecrite(s), {rows} faits, "
+          f"{len(emptied)} partition(s) supprimee(s), dimensions a jour")
+    return partitions
+
+def export_after_run(pg_conn, output_dir):
+    """Export lancé après une exécution déjà terminée : un échec est signalé sans
+    modifier l'exécution (le manifeste n'avance pas, le prochain export reprend)"""
+    try:
+        return export_parquet_snapshot(pg_conn, output_dir)
+    except Exception as e:
+        pg_conn.rollback()
+        print(f"   [WARN] Export Parquet echoue : {e} (repris au prochain export)")
+        return None
+
+# ============================================
+# EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    from etl_mongodb_to_dw import get_postgres_connection, acquire_etl_lock
+
+    parser = argparse.ArgumentParser(description="Export Parquet du Data Warehouse")
+    parser.add_argument('output_dir', help="Répertoire de l'instantané Parquet")
+    parser.add_argument('--full', action='store_true', help="Réécrire toutes les partitions")
+    args = parser.parse_args()
+
+    conn = get_postgres_connection()
+    try:
+        # Sous le verrou ETL : un chunk validé pendant l'export porterait un load_timestamp
+        # (début de sa transaction) antérieur à la borne de l'export, et serait manqué
+        if not acquire_etl_lock(conn):
+            print("[LOCK] Une instance ETL est en cours : relancer l'export a sa fin")
+        else:
+            export_parquet_snapshot(conn, args.output_dir, full=args.full)
+    finally:
+        conn.close()
@@ -0,0 +1,217 @@
+"""
+Distributions de scores précalculées pour les rapports (Power BI) : histogrammes à
+intervalles fixes et percentiles (p10, p25, médiane, p75, p90) de fact_exam_results.percentage,
+par examen, par filière et par mois.
+
+- Delta d'un rafraîchissement : les faits dont fact_id dépasse le dernier intégré (agg_refresh_state).
+  Le rafraîchissement s'exécute sous le verrou ETL : aucun chargement concurrent ne peut
+  valider un fact_id plus petit.
+- Faits modifiés (upsert des soumissions modifiées) : le trigger trg_fact_score_groups_dirty
+  note leurs groupes, anciens et nouveaux (agg_dirty_groups). Ces groupes sont recalculés
+  entièrement ; les autres reçoivent les comptes du delta, qui s'ajoutent aux comptes existants.
+- Faits supprimés ou rechargés : le nombre de faits intégrés (facts_counted) ne correspond plus
+  à COUNT(*) jusqu'à last_fact_id, et tout est recalculé.
+- Percentiles : non additifs, ils sont recalculés uniquement pour les groupes du delta et
+  les groupes modifiés.
+- Tout est validé dans une transaction : un delta n'est jamais compté deux fois.
+
+Lecture : vues vw_score_histogram et vw_score_percentiles.
+"""
+
+import argparse
+import time
+
+# Largeur des intervalles d'histogramme (points de pourcentage) ; un changement impose --full
+SCORE_BUCKET_WIDTH = 10
+
+# Grains des distributions : expression de la clé sur fact_exam_results f
+SCORE_GRAINS = {
+    'exam': 'f.exam_key',
+    'filiere': 'f.filiere_key',
+    'month': '(f.date_key / 100)',
+}
+
+AGGREGATE_NAME = 'score_distributions'
+
+# ============================================
+# REQUETES
+# ============================================
+
+# Faits du delta, et groupes modifiés du grain (copie de agg_dirty_groups pour ce rafraîchissement)
+DELTA_FACTS = "f.fact_id > %(last_fact_id)s AND f.fact_id <= %(high_fact_id)s"
+DIRTY_GROUPS = "SELECT grain_key FROM tmp_dirty_groups WHERE grain = %(grain)s"
+
+HISTOGRAM_INSERT = """
+    INSERT INTO agg_score_histogram (grain, grain_key, bucket_start, bucket_end, submissions)
+    SELECT %(grain)s, grain_key, bucket_start, bucket_start + %(width)s, COUNT(*)
+    FROM (
+        SELECT
+            {key} AS grain_key,
+            -- Un pourcentage de 100 tombe dans le dernier intervalle
+            LEAST(FLOOR(f.percentage / %(width)s) * %(width)s, 100 - %(width)s)::SMALLINT AS bucket_start
+        FROM fact_exam_results f
+        WHERE {where}
+    ) facts
+    GROUP BY grain_key, bucket_start
+    ON CONFLICT (grain, grain_key, bucket_start) DO UPDATE
+    SET submissions = agg_score_histogram.submissions + EXCLUDED.submissions
+"""
+
+# Groupes modifiés : tous leurs faits ; autres groupes : les faits du delta s'ajoutent
+HISTOGRAM_DIRTY = HISTOGRAM_INSERT.replace(
+    '{where}', f"f.fact_id <= %(high_fact_id)s AND {{key}} IN ({DIRTY_GROUPS})"
+)
+HISTOGRAM_DELTA = HISTOGRAM_INSERT.replace(
+    '{where}', f"{DELTA_FACTS} AND {{key}} NOT IN ({DIRTY_GROUPS})"
+)
+
+# percentile_cont(ARRAY[...]) : un seul tri par groupe pour les cinq percentiles
+PERCENTILES_REFRESH = f"""
+    INSERT INTO agg_score_percentiles (
+        grain, grain_key, submissions, avg_percentage,
+        p10, p25, median, p75, p90, refreshed_at
+    )
+    SELECT
+        %(grain)s, grain_key, submissions, avg_percentage,
+        p[1], p[2], p[3], p[4], p[5], CURRENT_TIMESTAMP
+    FROM (
+        SELECT
+            {{key}} AS grain_key,
+            COUNT(*) AS submissions,
+            ROUND(AVG(f.percentage), 2) AS avg_percentage,
+            percentile_cont(ARRAY[0.1, 0.25, 0.5, 0.75, 0.9]) WITHIN GROUP (ORDER BY f.percentage) AS p
+        FROM fact_exam_results f
+        WHERE {{key}} IN (
+            SELECT {{key}} FROM fact_exam_results f WHERE {DELTA_FACTS}
+            UNION
+            {DIRTY_GROUPS}
+        )
+        AND f.fact_id <= %(high_fact_id)s
+        GROUP BY {{key}}
+    ) touched
+    ON CONFLICT (grain, grain_key) DO UPDATE SET
+        submissions = EXCLUDED.submissions,
+        avg_percentage = EXCLUDED.avg_percentage,
+        p10 = EXCLUDED.p10,
+        p25 = EXCLUDED.p25,
+        median = EXCLUDED.median,
+        p75 = EXCLUDED.p75,
+        p90 = EXCLUDED.p90,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# ============================================
+# RAFRAICHISSEMENT
+# ============================================
+
+def refresh_score_distributions(pg_conn, full=False):
+    """Intégrer aux distributions les faits chargés ou modifiés depuis le dernier rafraîchissement
+
+    full : tout recalculer (aussi automatique si des faits ont été supprimés ou rechargés depuis)
+    Retourne le nombre de faits intégrés.
+    """
+    print("\n[AGG] Rafraichissement des distributions de scores...")
+    start = time.perf_counter()
+    cursor = pg_conn.cursor()
+
+    cursor.execute("""
+        INSERT INTO agg_refresh_state (aggregate_name) VALUES (%s)
+        ON CONFLICT (aggregate_name) DO NOTHING
+    """, (AGGREGATE_NAME,))
+    cursor.execute(
+        "SELECT last_fact_id, facts_counted FROM agg_refresh_state WHERE aggregate_name = %s FOR UPDATE",
+        (AGGREGATE_NAME,)
+    )
+    last_fact_id, facts_counted = cursor.fetchone()
+    cursor.execute("SELECT COALESCE(MAX(fact_id), 0) FROM fact_exam_results")
+    high_fact_id = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM fact_exam_results WHERE fact_id <= %s", (last_fact_id,))
+    facts_present = cursor.fetchone()[0]
+
+    # Faits supprimés ou rechargés depuis : les agrégats existants ne correspondent plus
+    if full or facts_counted is None or facts_present != facts_counted:
+        cursor.execute("TRUNCATE agg_score_histogram, agg_score_percentiles, agg_dirty_groups")
+        last_fact_id = 0
+        facts_counted = 0
+
+    # Groupes modifiés pris en compte par ce rafraîchissement ; le verrou bloque les
+    # upserts concurrents jusqu'au commit, aucun groupe n'est perdu entre copie et purge
+    cursor.execute("LOCK TABLE agg_dirty_groups IN EXCLUSIVE MODE")
+    cursor.execute("CREATE TEMP TABLE tmp_dirty_groups ON COMMIT DROP AS SELECT grain, grain_key FROM agg_dirty_groups")
+    dirty_groups = cursor.rowcount
+    cursor.execute("DELETE FROM agg_dirty_groups")
+
+    if high_fact_id == last_fact_id and not dirty_groups:
+        pg_conn.commit()
+        cursor.close()
+        print("   [OK] Aucun nouveau fait")
+        return 0
+
+    cursor.execute("""
+        DELETE FROM agg_score_histogram h
+        USING tmp_dirty_groups d
+        WHERE h.grain = d.grain AND h.grain_key = d.grain_key
+    """)
+
+    params = {
+        'width': SCORE_BUCKET_WIDTH,
+        'last_fact_id': last_fact_id,
+        'high_fact_id': high_fact_id,
+    }
+    groups = 0
+    for grain, key in SCORE_GRAINS.items():
+        params['grain'] = grain
+        cursor.execute(HISTOGRAM_DIRTY.format(key=key), params)
+        cursor.execute(HISTOGRAM_DELTA.format(key=key), params)
+        cursor.execute(PERCENTILES_REFRESH.format(key=key), params)
+        groups += cursor.rowcount
+
+    # Groupes vidés par des faits modifiés (changement d'examen, de filière ou de mois)
+    cursor.execute("""
+        DELETE FROM agg_score_percentiles p
+        USING tmp_dirty_groups d
+        WHERE p.grain = d.grain AND p.grain_key = d.grain_key
+          AND NOT EXISTS (
+              SELECT 1 FROM agg_score_histogram h
+              WHERE h.grain = p.grain AND h.grain_key = p.grain_key
+          )
+    """)
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM fact_exam_results WHERE fact_id > %s AND fact_id <= %s",
+        (last_fact_id, high_fact_id)
+    )
+    facts = cursor.fetchone()[0]
+    cursor.execute("""
+        UPDATE agg_refresh_state
+        SET last_fact_id = %s, facts_counted = %s, refreshed_at = CURRENT_TIMESTAMP
+        WHERE aggregate_name = %s
+    """, (high_fact_id, facts_counted + facts, AGGREGATE_NAME))
+    pg_conn.commit()
+    cursor.close()
+
+    print(f"   [OK] {facts} faits integres, {dirty_groups} groupe(s) modifie(s), "
+          f"{groups} groupe(s) recalcule(s) en {time.perf_counter() - start:.1f}s")
+    return facts
+
+# ============================================
+# EXECUTION
+# ============================================
+
+if __name__ == "__main__":
+    from etl_mongodb_to_dw import get_postgres_connection, ensure_etl_schema, acquire_etl_lock
+
+    parser = argparse.ArgumentParser(description="Distributions de scores précalculées")
+    parser.add_argument('--full', action='store_true', help="Tout recalculer")
+    args = parser.parse_args()
+
+    conn = get_postgres_connection()
+    try:
+        # Sous le verrou ETL : aucun chargement ne valide de faits pendant le calcul du delta
+        if not acquire_etl_lock(conn):
+            print("[LOCK] Une instance ETL est en cours : les distributions seront rafraichies a sa fin")
+        else:
+            ensure_etl_schema(conn)
+            refresh_score_distributions(conn, full=args.full)
+    finally:
+        conn.close()